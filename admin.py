@@ -0,0 +1,37 @@
+"""Hidden Admin page: what the running process spends its time on."""
+import pandas as pd
+import streamlit as st
+import telemetry
+from database import pool_stats
+
+
+def admin():
+    "Stage timings, frame sizes and cache counters of this process"
+    st.subheader("Stage timings and frame sizes")
+    histograms, counters = telemetry.summary()
+    if histograms:
+        st.dataframe(pd.DataFrame(histograms).style.format(precision=4))
+    else:
+        st.markdown("Nothing recorded yet")
+
+    st.subheader("Cache hits and misses")
+    caches = [row for row in counters if row["metric"] == "cache"]
+    if caches:
+        counts = pd.DataFrame(caches).pivot_table(
+            index="cache", columns="result", values="value", fill_value=0)
+        counts["hit_ratio"] = counts.get("hit", 0) / counts.sum(axis=1)
+        st.dataframe(counts)
+
+    stats = pool_stats() or {}
+    st.subheader("Database connections")
+    st.json(stats)
+
+    text = telemetry.prometheus(
+        {f"db_pool_{key}": value for key, value in stats.items()})
+    st.download_button(
+        "Download Prometheus metrics", text, file_name="metrics.prom",
+        mime="text/plain")
+    with st.expander("Prometheus text"):
+        st.code(text)
+    if st.button("Reset"):
+        telemetry.recorder.reset()
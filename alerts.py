@@ -0,0 +1,344 @@
+"""Price alerts raised from newly scraped rows.
+
+`scan()` runs after each ingest: `python alerts.py` once the scraper has
+finished, or as part of every `precompute` run. For each store it reads only
+the rows dated from that store's watermark on, averages them per style code
+and day, and checks each day's price against the style code's running mean
+and variance before folding it in with Welford's online update:
+
+- `spike`: the price is `ALERT_Z` or more standard deviations away from the
+  running mean, once `ALERT_MIN_DAYS` days have been seen
+- `above` / `below`: the price crosses a subscriber's threshold
+
+Prices are in the display currency. Watermarks, statistics, subscriptions
+and alerts live in a local SQLite file (`ALERTS_PATH`) that the Alerts page
+reads, so a scan costs the new rows and never reloads the history; in the
+database the `"date"` index from `python stores.py create-indexes` keeps it
+that way. A store scanned for the first time starts `ALERT_SEED_DAYS` back
+and raises nothing for those days.
+
+The watermark day is provisional, since the scraper may still have been
+writing it: the statistics from before it are kept, and the next scan
+folds the whole day in again from them, raising alerts only for the style
+codes that were new to that day.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pandas.io.sql as psql
+
+import telemetry
+from database import connection
+from stores import normalize_style_code, prepare, registry
+
+alerts_path = os.environ.get("ALERTS_PATH", os.path.join(".cache", "alerts.sqlite"))
+enabled = os.environ.get("ALERTS_ENABLED", "1") == "1"
+z_threshold = float(os.environ.get("ALERT_Z", 3.0))
+min_days = int(os.environ.get("ALERT_MIN_DAYS", 7))
+seed_days = int(os.environ.get("ALERT_SEED_DAYS", 30))
+
+stat_columns = ["days", "mean", "m2", "last_price", "last_date"]
+alert_columns = ["store", "style_code", "date", "kind", "price", "reference", "z"]
+
+schema = """
+    CREATE TABLE IF NOT EXISTS watermarks (
+        store TEXT PRIMARY KEY,
+        "date" TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS stats (
+        store TEXT NOT NULL,
+        style_code TEXT NOT NULL,
+        days INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        m2 REAL NOT NULL,
+        last_price REAL,
+        last_date TEXT,
+        PRIMARY KEY (store, style_code)
+    );
+    CREATE TABLE IF NOT EXISTS provisional (
+        store TEXT NOT NULL,
+        style_code TEXT NOT NULL,
+        days INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        m2 REAL NOT NULL,
+        last_price REAL,
+        last_date TEXT,
+        PRIMARY KEY (store, style_code)
+    );
+    CREATE TABLE IF NOT EXISTS subscriptions (
+        style_code TEXT PRIMARY KEY,
+        above REAL,
+        below REAL,
+        created TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        store TEXT NOT NULL,
+        style_code TEXT NOT NULL,
+        "date" TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        price REAL NOT NULL,
+        reference REAL,
+        z REAL,
+        created TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS alerts_style_code_idx ON alerts (style_code, id);
+"""
+
+
+class AlertStore:
+    "SQLite file shared by the scanner and the dashboard"
+
+    def __init__(self, path=None):
+        self.path = path or alerts_path
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connect(self):
+        "A connection that commits on success, with the schema in place"
+        with self._lock:
+            if not self._ready:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with sqlite3.connect(self.path) as conn:
+                    conn.executescript(schema)
+                self._ready = True
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def watermark(self, store):
+        "Date of the last scanned rows of `store`, None before its first scan"
+        with self.connect() as conn:
+            row = conn.execute(
+                'SELECT "date" FROM watermarks WHERE store = ?', (store,)).fetchone()
+        return date.fromisoformat(row[0]) if row else None
+
+    def stats(self, store, codes, provisional=False):
+        """Running statistics of `codes` in `store`, indexed by style code;
+        with `provisional`, the ones from before the watermark day"""
+        query = f"""
+            SELECT style_code, {", ".join(stat_columns)}
+            FROM {"provisional" if provisional else "stats"}
+            WHERE store = ? AND style_code IN (SELECT value FROM json_each(?))
+        """
+        with self.connect() as conn:
+            frame = pd.read_sql(query, conn, params=(store, json.dumps(list(codes))))
+        frame["last_date"] = frame["last_date"].map(
+            date.fromisoformat, na_action="ignore")
+        return frame.set_index("style_code")
+
+    def save(self, store, stats, watermark, alerts, provisional):
+        """Write updated statistics, the new watermark, the statistics from
+        before it and alerts in one transaction"""
+        created = datetime.utcnow().isoformat(timespec="seconds")
+        with self.connect() as conn:
+            conn.execute("DELETE FROM provisional WHERE store = ?", (store,))
+            for table, frame in (("stats", stats), ("provisional", provisional)):
+                conn.executemany(
+                    f"""INSERT OR REPLACE INTO {table}
+                            (store, style_code, {", ".join(stat_columns)})
+                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    [(store, code, int(days), mean, m2, last_price, str(last_date))
+                     for code, days, mean, m2, last_price, last_date
+                     in frame[stat_columns].itertuples()],
+                )
+            conn.execute(
+                'INSERT OR REPLACE INTO watermarks (store, "date") VALUES (?, ?)',
+                (store, str(watermark)))
+            rows = alerts[alert_columns].astype(object)
+            rows["date"] = rows["date"].astype(str)
+            rows = rows.where(rows.notna(), None)
+            conn.executemany(
+                """INSERT INTO alerts
+                       (store, style_code, "date", kind, price, reference, z, created)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(*row, created) for row in rows.itertuples(index=False)],
+            )
+
+    def subscribe(self, style_code, above=None, below=None):
+        "Follow `style_code`, optionally alerting when it crosses `above`/`below`"
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO subscriptions VALUES (?, ?, ?, ?)",
+                (normalize_style_code(style_code), above, below,
+                 datetime.utcnow().isoformat(timespec="seconds")))
+
+    def unsubscribe(self, style_code):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM subscriptions WHERE style_code = ?",
+                         (normalize_style_code(style_code),))
+
+    def subscriptions(self):
+        "Subscribed style codes with their thresholds, indexed by style code"
+        with self.connect() as conn:
+            return pd.read_sql(
+                "SELECT style_code, above, below, created FROM subscriptions "
+                "ORDER BY style_code", conn).set_index("style_code")
+
+    def alerts(self, codes=None, limit=100):
+        "The latest `limit` alerts, of `codes` only when given"
+        query = """
+            SELECT id, store, style_code, "date", kind, price, reference, z, created
+            FROM alerts
+        """
+        params = ()
+        if codes is not None:
+            query += " WHERE style_code IN (SELECT value FROM json_each(?))"
+            params = (json.dumps(list(codes)),)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self.connect() as conn:
+            return pd.read_sql(query, conn, params=params + (limit,))
+
+
+shared_store = AlertStore()
+
+
+def detect(stats, day, prices, subscriptions):
+    """Alerts raised by one day's `prices` (a Series by style code) and the
+    statistics with that day folded in"""
+    stats = stats.reindex(stats.index.union(prices.index))
+    stats["days"] = stats["days"].fillna(0)
+    stats["m2"] = stats["m2"].fillna(0.0)
+    current = stats.loc[prices.index]
+    x = prices.astype(float)
+    days = current["days"].astype(float)
+    mean = current["mean"].astype(float)
+    last = current["last_price"].astype(float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std = np.sqrt(current["m2"].astype(float) / (days - 1)).where(days > 1)
+        z = (x - mean) / std
+    spike = (days >= min_days) & (std > 0) & (z.abs() >= z_threshold)
+
+    thresholds = subscriptions.reindex(prices.index)
+    above = thresholds["above"].astype(float)
+    below = thresholds["below"].astype(float)
+    crossings = {
+        "above": (last < above) & (x >= above),
+        "below": (last > below) & (x <= below),
+    }
+
+    found = [pd.DataFrame({"kind": "spike", "price": x[spike],
+                           "reference": mean[spike], "z": z[spike]})]
+    for kind, crossed in crossings.items():
+        found.append(pd.DataFrame({
+            "kind": kind, "price": x[crossed],
+            "reference": thresholds[kind][crossed], "z": z[crossed]}))
+    alerts = pd.concat(found).round(2).rename_axis("style_code").reset_index()
+    alerts.insert(1, "date", day)
+
+    # Welford's update; a first price sets the mean and leaves m2 at zero
+    start = mean.fillna(0.0)
+    delta = x - start
+    updated = start + delta / (days + 1)
+    stats.loc[prices.index, "m2"] = current["m2"].astype(float) + delta * (x - updated)
+    stats.loc[prices.index, "mean"] = updated
+    stats.loc[prices.index, "days"] = days + 1
+    stats.loc[prices.index, "last_price"] = x
+    stats.loc[prices.index, "last_date"] = day
+    return alerts, stats
+
+
+def scan_rows(store, rows, alert_store=None, emit=True, subscriptions=None):
+    """Fold `date, style_code, price` rows of `store` (display currency) into
+    the statistics and return the alerts they raise; `emit=False` only
+    learns from them.
+
+    Rows of the watermark day replace the ones scanned for it before.
+    """
+    alert_store = alert_store or shared_store
+    if subscriptions is None:
+        subscriptions = alert_store.subscriptions()
+    watermark = alert_store.watermark(store)
+    daily = rows.groupby(["date", "style_code"], observed=True)["price"].mean()
+    codes = daily.index.unique("style_code")
+    stats = alert_store.stats(store, codes)
+    # codes of the watermark day scanned before start again from before it
+    revised = daily.loc[watermark].index \
+        if watermark in daily.index.unique("date") else []
+    rescanned = stats.index[stats["last_date"] == watermark].intersection(revised)
+    if len(rescanned):
+        stats = pd.concat([stats.drop(rescanned),
+                           alert_store.stats(store, rescanned, provisional=True)])
+    last_day = max(daily.index.unique("date"))
+    found = []
+    for day, prices in daily.groupby(level="date", observed=True):
+        prices = prices.droplevel("date")
+        if day == last_day:
+            provisional = stats.reindex(prices.index).dropna(subset=["mean"])
+        alerts, stats = detect(stats, day, prices, subscriptions)
+        if day == watermark:
+            alerts = alerts[~alerts["style_code"].isin(rescanned)]
+        found.append(alerts)
+    alerts = pd.concat(found, ignore_index=True).assign(store=store)
+    if not emit:
+        alerts = alerts.iloc[:0]
+    alert_store.save(store, stats.loc[codes], last_day, alerts, provisional)
+    return alerts[alert_columns]
+
+
+def fetch(store, watermark):
+    "`date, style_code, price` rows of `store` dated on or after `watermark`"
+    local = registry[store].snapshot
+    if local is not None:
+        local.sync(force=True)
+        return local.read(["date", "style_code", "price"],
+                          filters=[("date", ">=", watermark)])
+    with connection() as conn:
+        return psql.read_sql(registry[store].since_query, conn,
+                             params={"watermark": watermark})
+
+
+def scan(stores=None, alert_store=None):
+    "Scan the rows every store received since its last scan; returns the alerts"
+    alert_store = alert_store or shared_store
+    subscriptions = alert_store.subscriptions()
+    found = []
+    for store in stores or list(registry):
+        with telemetry.span(f"alerts.scan.{store}"):
+            watermark = alert_store.watermark(store)
+            seeding = watermark is None
+            if seeding:
+                watermark = date.today() - timedelta(days=seed_days)
+            rows = fetch(store, watermark)
+            telemetry.frame(f"alerts.scan.{store}", rows)
+            if rows.empty:
+                continue
+            found.append(scan_rows(store, prepare(store, rows), alert_store,
+                                   emit=not seeding, subscriptions=subscriptions))
+    if not found:
+        return pd.DataFrame(columns=alert_columns)
+    return pd.concat(found, ignore_index=True)
+
+
+def run(every=None):
+    "Scan once, or every `every` seconds"
+    while True:
+        start = time.perf_counter()
+        alerts = scan()
+        print(f"Raised {len(alerts)} alerts in {time.perf_counter() - start:.1f}s")
+        if every is None:
+            return
+        time.sleep(every)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan new prices for alerts")
+    parser.add_argument("--every", type=float, default=None,
+                        help="keep running, scanning every EVERY seconds")
+    args = parser.parse_args()
+    run(args.every)
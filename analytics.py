@@ -0,0 +1,84 @@
+"""Rolling-window price analytics over the daily price matrix.
+
+The backfilled `style_code` x `date` matrix is first aligned to a daily
+calendar: a day nobody was scraped takes the prices of the next scraped day,
+the same backfill the leaderboard pivot applies to each product, so an
+N-day lookback always lands on a column instead of missing an exact date
+key. Every metric is then computed for all products at once.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# lookbacks offered on the Home page, in days
+windows = (7, 30, 90)
+# sneakers resell every day, so a year has 365 return periods
+periods_per_year = 365
+
+columns = [
+    "style_code",
+    "price",
+    "return_pct",
+    "moving_average",
+    "volatility",
+    "annualized_volatility",
+    "max_drawdown",
+]
+
+
+def calendar(matrix):
+    "`matrix` with one column per day from its first to its last date"
+    if matrix.shape[1] == 0:
+        return matrix
+    ordinals = np.array([day.toordinal() for day in matrix.columns])
+    days = np.arange(ordinals[0], ordinals[-1] + 1)
+    # the first scraped day on or after each calendar day
+    positions = np.searchsorted(ordinals, days)
+    return pd.DataFrame(
+        matrix.to_numpy()[:, positions],
+        index=matrix.index,
+        columns=pd.Index([date.fromordinal(int(day)) for day in days],
+                         name="date", dtype=object),
+    )
+
+
+def window_metrics(matrix, window, rate=1.0):
+    """Metrics of the last `window` days of a `calendar`-aligned matrix.
+
+    - `return_pct`: change from `window` days before the last date (NaN when
+      the history is shorter)
+    - `moving_average`: mean price over the window
+    - `volatility`: standard deviation of daily log returns in the window,
+      in percent, and `annualized_volatility` the same scaled to a year
+    - `max_drawdown`: deepest fall from a running high within the window,
+      in percent (zero or negative)
+
+    Prices are multiplied by `rate`; the ratios do not depend on it.
+    """
+    prices = matrix.to_numpy(dtype=float)
+    latest = prices[:, -1] if prices.shape[1] else np.full(len(prices), np.nan)
+    recent = prices[:, -window:]
+    if prices.shape[1] > window:
+        start = prices[:, -window - 1]
+    else:
+        start = np.full(len(prices), np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(prices[:, -window - 1:]), axis=1)
+        drawdown = recent / np.fmax.accumulate(recent, axis=1) - 1
+        change = (latest / start - 1) * 100
+    volatility = pd.DataFrame(returns).std(axis=1).to_numpy() * 100
+
+    metrics = pd.DataFrame(
+        {
+            "price": latest * rate,
+            "return_pct": change,
+            "moving_average": pd.DataFrame(recent).mean(axis=1).to_numpy() * rate,
+            "volatility": volatility,
+            "annualized_volatility": volatility * periods_per_year ** 0.5,
+            "max_drawdown": pd.DataFrame(drawdown).min(axis=1).to_numpy() * 100,
+        },
+        index=matrix.index,
+    ).round(2)
+    return metrics.reset_index()[columns]
@@ -1,31 +1,47 @@
 # import libraries
+import os
+
 import streamlit as st
 from streamlit_option_menu import option_menu
-from dashboard import home, search
+import fx
+import pages
+from database import pool_stats
 
 # -------------- SETTINGS --------------
 page_title = "Nike Dunk Sneakers Price Tracker"
 # emojis: https://www.webfx.com/tools/emoji-cheat-sheet/
 page_icon = ":shoe:"
 layout = "wide"
+# the Admin page is only listed when the URL carries ?admin=<ADMIN_KEY>
+admin_key = os.environ.get("ADMIN_KEY")
 # --------------------------------------
 
 
 st.set_page_config(page_title=page_title, page_icon=page_icon, layout=layout)
 st.title(page_title)
 
+show_admin = bool(admin_key) and \
+    st.experimental_get_query_params().get("admin") == [admin_key]
+menu = pages.menu(show_hidden=show_admin)
+
 # Option Menu
 selected = option_menu(
     None,
-    ["Home", "Search"],
-    icons=["house", "search"],
+    [page.label for page in menu],
+    icons=[page.icon for page in menu],
     menu_icon="cast",
     default_index=0,
     orientation="horizontal",
 )
 
-if selected == "Home":
-    home()
+# only the selected page's module and dependencies are imported
+try:
+    next(page for page in menu if page.label == selected).render()
+except fx.FxError as error:
+    st.error(f"Prices cannot be converted right now. {error}")
 
-elif selected == "Search":
-    search()
+# Connection pool stats
+stats = pool_stats()
+if stats is not None:
+    with st.sidebar.expander("Database connections"):
+        st.json(stats)
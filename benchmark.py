@@ -0,0 +1,807 @@
+"""Benchmarks for the dashboard's data processing.
+
+Run with `python benchmark.py`; pass `--sizes 1000 10000` to pick the number
+of style codes, `--only scenarios` to run a single benchmark and
+`--json results.json` to also write every measurement for regression
+tracking. Data comes from `synthetic`, with SQLite standing in for Postgres.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import loading
+import synthetic
+from data import aggregate_sole_supplier
+from leaderboard import page
+from metrics import daily_pivot, price_metrics, rank_by_volatility
+from snapshot import Snapshot
+from sql_engine import read_leaderboard
+from suggest import SuggestionIndex
+from utils import fillna_mode, style_signs
+
+results = []
+
+
+def record(benchmark, **fields):
+    "Keep one measurement for the `--json` report"
+    results.append({"benchmark": benchmark, **fields})
+
+
+def read_sole_supplier(connection):
+    "The Home page's typed `sole_supplier` read against the SQLite stand-in"
+    return loading.read_sql(
+        'SELECT "date", style_code, product_title, ROUND(price,2) AS price,'
+        " image_url FROM sole_supplier",
+        connection,
+    )
+
+
+def legacy_read_sole_supplier(connection):
+    "Every column as Python objects, the Home read before `loading`"
+    frame = pd.read_sql(
+        'SELECT "date", style_code, product_title, ROUND(price,2) AS price,'
+        " image_url FROM sole_supplier",
+        connection,
+    )
+    frame["date"] = pd.to_datetime(frame["date"]).dt.date
+    return frame
+
+
+def legacy_aggregate_sole_supplier(sole_supplier, rate):
+    "Home leaderboard as built before `loading`, copies included"
+    sole_supplier = sole_supplier.copy()
+    sole_supplier["price"] = sole_supplier["price"] * rate
+    start_date, end_date = sole_supplier.date.min(), sole_supplier.date.max()
+    sole_supplier.drop_duplicates(inplace=True)
+    sole_supplier.sort_values(by=["style_code", "date"], inplace=True)
+    titles = dict(set(zip(sole_supplier["style_code"].values,
+                          sole_supplier["product_title"].values)))
+    agg = sole_supplier.groupby(["style_code", "date"])[
+        "price"].mean().unstack().bfill(axis=1)
+    agg = price_metrics(agg, start_date, end_date)
+    agg["product_title"] = agg.index.map(titles)
+    return rank_by_volatility(agg), start_date, end_date
+
+
+def legacy_price_metrics(prices, start_date, end_date):
+    "Row-by-row `apply` implementation the Home page used before `price_metrics`"
+    agg = prices.copy()
+    num_days = (end_date - start_date).days
+    agg["volatility"] = agg.apply(
+        lambda x: (x.std()) / (num_days ** 0.5), axis=1)
+    agg["price_change"] = agg.apply(
+        lambda x: round((x[end_date] - x[start_date]), 2), axis=1)
+    for column, days in (("daily_pct", 1), ("weekly_pct", 7)):
+        previous = end_date - timedelta(days=days)
+        agg[column] = agg.apply(
+            lambda x: round((x[end_date] - x[previous]) / x[previous] * 100, 2),
+            axis=1,
+        )
+    agg["total_pct"] = agg.apply(
+        lambda x: round((x[end_date] - x[start_date]) / x[start_date] * 100, 2),
+        axis=1,
+    )
+    return agg[["volatility", "price_change", "daily_pct", "weekly_pct",
+                "total_pct"]]
+
+
+def legacy_fillna_mode(dataframe):
+    "Cell-by-cell `fillna_mode` the dashboard used before the vectorized one"
+    from math import isnan
+
+    opts = list(dataframe.columns)
+    df = dataframe[opts].mode(axis=1).reset_index()
+    mode_lst = list(zip(df.iloc[:, 0], df.iloc[:, 1]))
+    for idx in dataframe.index:
+        for index, value in enumerate(dataframe.loc[idx].values):
+            if isnan(value):
+                value = dict(mode_lst)[idx]
+                dataframe.loc[idx].values[index] = value
+    return dataframe
+
+
+def reference_fillna_mode(dataframe):
+    "Row-wise mode fill spelled out with pandas, the expected `fillna_mode` result"
+    modes = dataframe.mode(axis=1).iloc[:, 0]
+    return dataframe.apply(lambda row: row.fillna(modes[row.name]), axis=1)
+
+
+def check_fillna_mode():
+    "Edge cases: ties, all-nan rows, rows without nan, mixed columns"
+    frame = pd.DataFrame(
+        {
+            "a": [1.0, np.nan, 2.0, np.nan, 5.0],
+            "b": [1.0, np.nan, 3.0, 4.0, 5.0],
+            "c": [np.nan, np.nan, np.nan, 4.0, 6.0],
+            "d": [2.0, np.nan, 3.0, np.nan, 7.0],
+        },
+        index=["x", "y", "z", "w", "v"],
+    )
+    pd.testing.assert_frame_equal(
+        fillna_mode(frame.copy()), reference_fillna_mode(frame))
+
+    mixed = frame.assign(title="Dunk", count=[1, 2, 3, 4, 5])
+    filled = fillna_mode(mixed.copy())
+    assert filled["title"].eq("Dunk").all()
+    assert filled["count"].tolist() == [1, 2, 3, 4, 5]
+    assert filled.loc["x", "c"] == 1.0 and filled.loc["w", "a"] == 4.0
+
+
+def check_downsample():
+    "LTTB keeps the ends and extremes and skips missing prices"
+    from charts import downsample, lttb
+
+    x = np.arange(2000.0)
+    y = np.sin(x / 50)
+    y[[0, 700, 1500]] = np.nan
+    y[300] = 5.0
+    kept = lttb(x, y, 500)
+    assert len(kept) == 500 and not np.isnan(y[kept]).any()
+    assert kept[0] == 1 and kept[-1] == 1999 and 300 in kept
+    assert np.all(np.diff(kept) > 0)
+
+    data = pd.DataFrame({
+        "date": pd.date_range("2022-01-01", periods=2000).date,
+        "price": y,
+        "store": np.repeat(["a", "b"], 1000),
+    })
+    rows = downsample(data, group="store", points=100)
+    assert len(rows) == 200 and rows["price"].notna().all()
+
+
+def check_repeated_rows():
+    """Rows repeated in every column count once and rows differing only in
+    `image_url` count separately, on every Home engine"""
+    from ingest import IncrementalLoader
+
+    day_1, day_2 = "2022-01-01", "2022-01-02"
+    rows = pd.DataFrame(
+        [(day_1, "DD1391-100", "Dunk", 100.0, "u"),
+         (day_2, "DD1391-100", "Dunk", 100.0, "u"),
+         (day_2, "DD1391-100", "Dunk", 100.0, "u"),
+         (day_2, "DD1391-100", "Dunk", 100.0, "v"),
+         (day_2, "DD1391-100", "Dunk", 130.0, "u")],
+        columns=["date", "style_code", "product_title", "price", "image_url"],
+    )
+    connection = synthetic.database({"sole_supplier": rows})
+    frame = read_sole_supplier(connection)
+    loader = IncrementalLoader()
+    loader.append(frame)
+    engines = {
+        "pandas": aggregate_sole_supplier(frame, 1.0)[0],
+        "sql": read_leaderboard(connection, 1.0, "sqlite")[0],
+        "incremental": loader.leaderboard(1.0)[0],
+    }
+    connection.close()
+    for engine, leaderboard in engines.items():
+        found = leaderboard.set_index("style_code").loc["DD1391-100"]
+        assert (found["price"], found["price_change"]) == (110.0, 10.0), engine
+
+
+def check_late_rows():
+    "Rows arriving for a day `IncrementalLoader` already applied revise it"
+    from ingest import IncrementalLoader
+
+    rows = pd.DataFrame(
+        [("2022-01-01", "DD1391-100", "Dunk", 100.0, "u"),
+         ("2022-01-01", "DZ5485-612", "Jordan 1", 100.0, "u"),
+         ("2022-01-02", "DD1391-100", "Dunk", 110.0, "u"),
+         ("2022-01-02", "DZ5485-612", "Jordan 1", 120.0, "u")],
+        columns=["date", "style_code", "product_title", "price", "image_url"],
+    )
+    connection = synthetic.database({"sole_supplier": rows})
+    frame = read_sole_supplier(connection)
+    connection.close()
+    expected = aggregate_sole_supplier(frame, 1.0)[0].set_index("style_code")
+
+    day_1, day_2 = frame["date"].min(), frame["date"].max()
+    loader = IncrementalLoader()
+    loader.append(frame[frame["date"] == day_1])
+    loader.append(frame[(frame["date"] == day_2)
+                        & (frame["style_code"] == "DD1391-100")])
+    # the re-read from the watermark on repeats the rows already applied
+    loader.append(frame[frame["date"] == day_2])
+    actual = loader.leaderboard(1.0)[0].set_index("style_code")
+    pd.testing.assert_frame_equal(
+        actual.loc[expected.index, ["price", "price_change", "volatility"]],
+        expected[["price", "price_change", "volatility"]], check_dtype=False)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_price_metrics(sizes):
+    print("price_metrics: style codes x 365 days")
+    print(f"{'style codes':>12} {'apply (s)':>10} {'vectorized (s)':>15} {'speedup':>8}")
+    for size in sizes:
+        prices = synthetic.price_pivot(size)
+        start_date, end_date = prices.columns[0], prices.columns[-1]
+        legacy, legacy_time = timed(
+            legacy_price_metrics, prices, start_date, end_date)
+        metrics, vector_time = timed(price_metrics, prices, start_date, end_date)
+        np.testing.assert_allclose(
+            legacy.to_numpy(float), metrics[legacy.columns].to_numpy(float))
+        record("price_metrics", size=size, apply_s=legacy_time,
+               vectorized_s=vector_time)
+        print(f"{size:>12} {legacy_time:>10.3f} {vector_time:>15.3f} "
+              f"{legacy_time / vector_time:>7.1f}x")
+
+
+def bench_fillna_mode(sizes, n_days=365):
+    check_fillna_mode()
+    print("fillna_mode: rows x 365 days, 5% nan")
+    print(f"{'rows':>12} {'legacy (s)':>11} {'vectorized (s)':>15} {'speedup':>8}")
+    for size in sizes:
+        rng = np.random.default_rng(size)
+        values = np.round(rng.uniform(100, 110, size=(size, n_days)))
+        values[rng.random(values.shape) < 0.05] = np.nan
+        frame = pd.DataFrame(values)
+        _, legacy_time = timed(legacy_fillna_mode, frame.copy())
+        filled, vector_time = timed(fillna_mode, frame.copy())
+        if size <= 1_000:
+            pd.testing.assert_frame_equal(filled, reference_fillna_mode(frame))
+        record("fillna_mode", size=size, legacy_s=legacy_time,
+               vectorized_s=vector_time)
+        print(f"{size:>12} {legacy_time:>11.3f} {vector_time:>15.3f} "
+              f"{legacy_time / vector_time:>7.1f}x")
+
+
+def bench_suggest(sizes, n_queries=1_000):
+    print("SuggestionIndex: build, memory and query latency")
+    print(f"{'codes':>12} {'build (s)':>10} {'memory (MB)':>12} "
+          f"{'prefix (us)':>12} {'fuzzy (us)':>11}")
+    for size in sizes:
+        rng = np.random.default_rng(size)
+        codes = synthetic.style_codes(size)
+        entries = [(code, f"{title} {i}") for i, (code, title) in enumerate(
+            zip(codes, synthetic.product_titles(codes)))]
+        index, build_time = timed(SuggestionIndex().build, entries)
+        tracemalloc.start()
+        measured = SuggestionIndex().build(entries)
+        memory = tracemalloc.get_traced_memory()[0] / 2 ** 20
+        tracemalloc.stop()
+        del measured
+
+        queries = [entries[i][0][:4] for i in rng.integers(size, size=n_queries)]
+        _, prefix_time = timed(lambda: [index.prefix(q) for q in queries])
+        typos = [entries[i][0].replace("-", "")[:-1]
+                 for i in rng.integers(size, size=n_queries // 10)]
+        _, fuzzy_time = timed(lambda: [index.suggest(q) for q in typos])
+        prefix_us = prefix_time / n_queries * 1e6
+        fuzzy_us = fuzzy_time / len(typos) * 1e6
+        record("suggest", size=size, build_s=build_time, memory_mb=memory,
+               prefix_us=prefix_us, fuzzy_us=fuzzy_us)
+        print(f"{size:>12} {build_time:>10.3f} {memory:>12.1f} "
+              f"{prefix_us:>12.1f} {fuzzy_us:>11.1f}")
+
+
+def peak_rss():
+    "Peak resident set size of this process in MB"
+    # ru_maxrss survives exec on Linux, so a spawned child would report its
+    # parent's peak; VmHWM belongs to the new address space
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cold_start(mode, source, rate=1.2):
+    """Fresh process: seconds and peak RSS (MB) once the history is loaded and
+    once the Home leaderboard is ready"""
+    start = time.perf_counter()
+    if mode == "read_sql":
+        frame = read_sole_supplier(sqlite3.connect(source))
+    else:
+        frame = Snapshot("sole_supplier", None, columns=[
+            "date", "style_code", "product_title", "price", "image_url"],
+            path=source).read(loading.views["home"], typed=True)
+    loaded = time.perf_counter() - start
+    loaded_rss = peak_rss()
+    aggregate_sole_supplier(frame, rate)
+    elapsed = time.perf_counter() - start
+    return [loaded, loaded_rss, elapsed, peak_rss()]
+
+
+def bench_cold_start(sizes):
+    print("Cold start to first Home render: read_sql (SQLite file) vs Parquet snapshot")
+    print(f"{'style codes':>12} {'source':>9} {'load (s)':>9} {'RSS (MB)':>9} "
+          f"{'first render (s)':>17} {'peak RSS (MB)':>14}")
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        rows = synthetic.sole_supplier(size)
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "prices.db")
+            synthetic.database({"sole_supplier": rows}, db_path).close()
+            snapshot_path = os.path.join(directory, "snapshot")
+            Snapshot("sole_supplier", None, columns=list(rows.columns),
+                     path=snapshot_path).write(rows)
+
+            for mode, source in (("read_sql", db_path), ("snapshot", snapshot_path)):
+                with context.Pool(1) as pool:
+                    load, load_rss, total, peak_rss = pool.apply(
+                        _cold_start, (mode, source))
+                record("cold_start", size=size, source=mode, load_s=load,
+                       load_rss_mb=load_rss, first_render_s=total,
+                       peak_rss_mb=peak_rss)
+                print(f"{size:>12} {mode:>9} {load:>9.3f} {load_rss:>9.0f} "
+                      f"{total:>17.3f} {peak_rss:>14.0f}")
+
+
+def assert_same_leaderboard(actual, expected):
+    "Two Home leaderboards agree on every style code, to the cent"
+    (actual, actual_start, actual_end), (expected, start, end) = actual, expected
+    assert (actual_start, actual_end) == (start, end)
+    expected = expected.set_index("style_code").sort_index()
+    actual = actual.set_index("style_code").sort_index()
+    numeric = expected.columns.drop("product_title")
+    np.testing.assert_allclose(
+        actual[numeric].to_numpy(float), expected[numeric].to_numpy(float),
+        atol=0.011)
+
+
+def check_sql_engine(size=200, rate=1.2):
+    "The SQL engine's leaderboard matches the pandas aggregation"
+    connection = synthetic.database(
+        {"sole_supplier": synthetic.sole_supplier(size)})
+    expected = aggregate_sole_supplier(read_sole_supplier(connection), rate)
+    actual = read_leaderboard(connection, rate, "sqlite")
+    connection.close()
+    assert_same_leaderboard(actual, expected)
+
+
+def bench_sql_engine(sizes, rate=1.2):
+    print("Home leaderboard: pandas aggregation vs SQL engine (SQLite stand-in)")
+    print(f"{'style codes':>12} {'pandas (s)':>11} {'sql (s)':>8}")
+    check_repeated_rows()
+    for size in sizes:
+        connection = synthetic.database(
+            {"sole_supplier": synthetic.sole_supplier(size)})
+        expected, pandas_time = timed(
+            lambda: aggregate_sole_supplier(read_sole_supplier(connection), rate))
+        actual, sql_time = timed(read_leaderboard, connection, rate, "sqlite")
+        connection.close()
+
+        assert_same_leaderboard(actual, expected)
+        record("sql_engine", size=size, pandas_s=pandas_time, sql_s=sql_time)
+        print(f"{size:>12} {pandas_time:>11.3f} {sql_time:>8.3f}")
+
+
+def bench_incremental(sizes, n_days=120, batch_days=10, rate=1.2):
+    """Home leaderboard from `IncrementalLoader`, fed one day at a time and
+    `batch_days` at a time, against `aggregate_sole_supplier`; times the full
+    aggregation and the last one-day append"""
+    from ingest import IncrementalLoader
+
+    print(f"Home leaderboard: full aggregation vs incremental append "
+          f"(style codes x {n_days} days)")
+    print(f"{'style codes':>12} {'full (s)':>9} {'one day (s)':>12}")
+    check_repeated_rows()
+    check_late_rows()
+    for size in sizes:
+        connection = synthetic.database(
+            {"sole_supplier": synthetic.sole_supplier(size, n_days, seed=size)})
+        frame = read_sole_supplier(connection)
+        connection.close()
+        (expected, start, end), full_time = timed(
+            aggregate_sole_supplier, frame, rate)
+        expected = expected.set_index("style_code").sort_index()
+        numeric = expected.columns.drop("product_title")
+
+        days = sorted(frame["date"].unique())
+        for step in (1, batch_days):
+            loader = IncrementalLoader()
+            for first in range(0, len(days), step):
+                rows = frame[frame["date"].isin(days[first:first + step])]
+                _, append_time = timed(loader.append, rows)
+            actual, loader_start, loader_end = loader.leaderboard(rate)
+            assert (loader_start, loader_end) == (start, end)
+            actual = actual.set_index("style_code").sort_index()
+            assert actual.index.equals(expected.index)
+            pd.testing.assert_series_equal(
+                actual["product_title"], expected["product_title"],
+                check_dtype=False)
+            np.testing.assert_allclose(
+                actual[numeric].to_numpy(float), expected[numeric].to_numpy(float),
+                atol=0.011)
+            if step == 1:
+                day_time = append_time
+
+        record("incremental", size=size, days=n_days, full_s=full_time,
+               append_day_s=day_time)
+        print(f"{size:>12} {full_time:>9.3f} {day_time:>12.3f}")
+
+
+def _traced(func, *args):
+    "Result of `func(*args)` with the MB it retained and its peak MB"
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current / 2 ** 20, peak / 2 ** 20
+
+
+def bench_memory(sizes, n_days=365, rate=1.2):
+    """Home history and leaderboard memory: object columns and copies vs the
+    projected, typed `loading` frame"""
+    print(f"Home memory: style codes x {n_days} days, legacy vs typed (MB)")
+    print(f"{'style codes':>12} {'rows':>10} {'path':>7} {'frame':>8} "
+          f"{'load peak':>10} {'aggregate peak':>15}")
+    for size in sizes:
+        connection = synthetic.database(
+            {"sole_supplier": synthetic.sole_supplier(size, n_days, seed=size)})
+        paths = (("legacy", legacy_read_sole_supplier, legacy_aggregate_sole_supplier),
+                 ("typed", read_sole_supplier, aggregate_sole_supplier))
+        aggregates = []
+        for name, read, aggregate in paths:
+            frame, _, load_peak = _traced(read, connection)
+            frame_mb = loading.memory_mb(frame)
+            (agg, _, _), _, aggregate_peak = _traced(aggregate, frame, rate)
+            aggregates.append(agg.set_index(agg["style_code"].astype(str)).sort_index())
+            record("memory", size=size, days=n_days, path=name, rows=len(frame),
+                   frame_mb=frame_mb, load_peak_mb=load_peak,
+                   aggregate_peak_mb=aggregate_peak)
+            print(f"{size:>12} {len(frame):>10} {name:>7} {frame_mb:>8.1f} "
+                  f"{load_peak:>10.1f} {aggregate_peak:>15.1f}")
+        connection.close()
+
+        # float32 prices move results by well under a cent
+        legacy, typed = aggregates
+        numeric = legacy.columns.drop(["product_title", "style_code"])
+        np.testing.assert_allclose(
+            typed[numeric].to_numpy(float), legacy[numeric].to_numpy(float),
+            atol=0.011, rtol=1e-5)
+
+
+def _lookup(connection, store, style_code):
+    "`Store.lookup_query` bound for SQLite's named parameter style"
+    from stores import registry
+
+    query = registry[store].lookup_query.replace("%(style_code)s", ":style_code")
+    return pd.read_sql(query, connection, params={"style_code": style_code})
+
+
+def bench_scenarios(sizes, n_days=365, n_lookups=50, rate=1.2):
+    """Home and Search end to end against synthetic `sole_supplier` and `goat`
+    tables: load, pivot, metrics, full leaderboard, indexed store lookups,
+    one leaderboard page and one compare-all-stores chart"""
+    # imported here so spawned cold start processes don't pay for plotly
+    import fx
+    from charts import price_chart
+    from stores import prepare, registry
+
+    check_downsample()
+    fx.set_service(fx.FxService(fx.FixtureProvider({("GBP", "USD"): rate})))
+    print(f"Home and Search scenarios: style codes x {n_days} days (SQLite stand-in)")
+    print(f"{'style codes':>12} {'rows':>10} {'load (s)':>9} {'pivot (s)':>10} "
+          f"{'metrics (s)':>12} {'home (s)':>9} {'lookup (ms)':>12} "
+          f"{'page (ms)':>10} {'chart (ms)':>11}")
+    for size in sizes:
+        sole_supplier = synthetic.sole_supplier(size, n_days, seed=size)
+        connection = synthetic.database({
+            "sole_supplier": sole_supplier,
+            "goat": synthetic.goat(size, n_days, seed=size),
+        })
+        for store in registry.values():
+            connection.execute(store.index_ddl)
+
+        frame, load_time = timed(read_sole_supplier, connection)
+        start_date, end_date = frame["date"].min(), frame["date"].max()
+        pivot, pivot_time = timed(
+            lambda: daily_pivot(frame).bfill(axis=1))
+        _, metrics_time = timed(
+            lambda: price_metrics(pivot, start_date, end_date)
+            .assign(product_title="").pipe(rank_by_volatility))
+        (agg, _, _), home_time = timed(aggregate_sole_supplier, frame, rate)
+
+        rng = np.random.default_rng(size)
+        codes = sole_supplier["style_code"].unique()
+        codes = codes[rng.integers(len(codes), size=n_lookups)]
+        _, lookup_time = timed(lambda: [
+            prepare(store, _lookup(connection, store, code))
+            for code in codes for store in registry])
+        lookup_ms = lookup_time / n_lookups * 1e3
+
+        def render_page():
+            rows, _, _ = page(agg, sort_by="price_change", text="dunk")
+            return style_signs(rows)
+
+        _, page_time = timed(render_page)
+
+        def render_chart():
+            data = pd.concat([
+                prepare(store, _lookup(connection, store, codes[0]))
+                .assign(store=registry[store].label)
+                for store in registry
+            ], ignore_index=True)
+            return price_chart(data, codes[0], color="store").to_json()
+
+        _, chart_time = timed(render_chart)
+        connection.close()
+
+        record("scenarios", size=size, days=n_days, rows=len(frame),
+               load_s=load_time, pivot_s=pivot_time, metrics_s=metrics_time,
+               home_s=home_time, lookup_ms=lookup_ms, page_ms=page_time * 1e3,
+               chart_ms=chart_time * 1e3)
+        print(f"{size:>12} {len(frame):>10} {load_time:>9.3f} {pivot_time:>10.3f} "
+              f"{metrics_time:>12.3f} {home_time:>9.3f} {lookup_ms:>12.2f} "
+              f"{page_time * 1e3:>10.2f} {chart_time * 1e3:>11.2f}")
+
+
+def _batch_lookup(connection, store, codes):
+    "`Store.batch_query` with SQLite's `json_each` standing in for `= ANY`"
+    from stores import registry
+
+    query = registry[store].batch_query.replace(
+        "= ANY(%(style_codes)s)", "IN (SELECT value FROM json_each(:style_codes))")
+    return pd.read_sql(
+        query, connection, params={"style_codes": json.dumps(list(codes))})
+
+
+def bench_portfolio(sizes, n_codes=5_000, n_days=365, rate=1.2):
+    """Portfolio valuation of `sizes` holdings: one lookup and quote per
+    holding vs one batched query per store and a single vectorized quote"""
+    import fx
+    import holdings
+    from stores import registry
+
+    fx.set_service(fx.FxService(fx.FixtureProvider({("GBP", "USD"): rate})))
+    sole_supplier = synthetic.sole_supplier(n_codes, n_days, seed=n_codes)
+    connection = synthetic.database({
+        "sole_supplier": sole_supplier,
+        "goat": synthetic.goat(n_codes, n_days, seed=n_codes),
+    })
+    for store in registry.values():
+        connection.execute(store.index_ddl)
+    all_codes = sole_supplier["style_code"].unique()
+
+    print(f"Portfolio valuation: holdings out of {n_codes} style codes x "
+          f"{n_days} days (SQLite stand-in)")
+    print(f"{'holdings':>9} {'per holding (s)':>16} {'batched (s)':>12} "
+          f"{'speedup':>8}")
+    for size in sizes:
+        rng = np.random.default_rng(size)
+        upload = pd.DataFrame({
+            "style_code": all_codes[rng.integers(len(all_codes), size=size)],
+            "size": rng.choice(["8", "9.5", "10", "11"], size=size),
+            "purchase_price": rng.uniform(80, 300, size).round(2),
+        }).to_csv(index=False)
+
+        def per_holding():
+            chunk = next(holdings.read_holdings(io.StringIO(upload), size))
+            quotes = {
+                store: pd.concat([
+                    holdings.quote(store, _lookup(connection, store, code)
+                                   .assign(style_code=code))
+                    for code in chunk["style_code"]
+                ]).groupby(level=0).last()
+                for store in registry
+            }
+            return {store: holdings.value(chunk, quote)
+                    for store, quote in quotes.items()}
+
+        def batched():
+            valued = {store: [] for store in registry}
+            for chunk in holdings.read_holdings(io.StringIO(upload)):
+                codes = chunk["style_code"].unique()
+                for store in registry:
+                    quote = holdings.quote(
+                        store, _batch_lookup(connection, store, codes))
+                    valued[store].append(holdings.value(chunk, quote))
+            return {store: pd.concat(frames, ignore_index=True)
+                    for store, frames in valued.items()}
+
+        expected, loop_time = timed(per_holding)
+        valued, batch_time = timed(batched)
+        for store in registry:
+            pd.testing.assert_frame_equal(
+                valued[store], expected[store], check_dtype=False)
+
+        record("portfolio", holdings=size, codes=n_codes, days=n_days,
+               per_holding_s=loop_time, batched_s=batch_time)
+        print(f"{size:>9} {loop_time:>16.3f} {batch_time:>12.3f} "
+              f"{loop_time / batch_time:>7.1f}x")
+    connection.close()
+
+
+def check_since_query(n_days=30):
+    """`Store.since_query` reads only the days from the watermark on, through
+    the date index"""
+    from stores import registry
+
+    connection = synthetic.database({
+        "sole_supplier": synthetic.sole_supplier(100, n_days),
+        "goat": synthetic.goat(100, n_days),
+    })
+    watermark = str(synthetic.start_date + timedelta(days=n_days - 2))
+    for store in registry.values():
+        connection.execute(store.date_index_ddl)
+        query = store.since_query.replace("%(watermark)s", ":watermark")
+        plan = " ".join(row[-1] for row in connection.execute(
+            f"EXPLAIN QUERY PLAN {query}", {"watermark": watermark}))
+        assert f"{store.table}_date_idx" in plan, plan
+        rows = pd.read_sql(query, connection, params={"watermark": watermark})
+        assert (rows["date"] >= watermark).all() and (rows["date"] == watermark).any()
+    connection.close()
+
+
+def bench_alerts(sizes, n_days=365, seed_days=335, rate=1.2):
+    """Alert scans of one new day at a time after `seed_days` of history:
+    the scan cost follows the new rows, not the history behind them"""
+    import alerts
+    import fx
+    from stores import prepare
+
+    fx.set_service(fx.FxService(fx.FixtureProvider({("GBP", "USD"): rate})))
+    check_since_query()
+    print(f"Alert scans: one new day per scan after {seed_days} days of history")
+    print(f"{'style codes':>12} {'new rows':>9} {'scan (ms)':>10} {'alerts':>7}")
+    for size in sizes:
+        rows = prepare("sole_supplier", synthetic.sole_supplier(
+            size, n_days, seed=size)[["date", "style_code", "price"]])
+        days = sorted(rows["date"].unique())
+        with tempfile.TemporaryDirectory() as directory:
+            store = alerts.AlertStore(os.path.join(directory, "alerts.sqlite"))
+            alerts.scan_rows("sole_supplier", rows[rows["date"] < days[seed_days]],
+                             store, emit=False)
+            timings, raised, new_rows = [], 0, 0
+            for day in days[seed_days:]:
+                batch = rows[rows["date"] == day]
+                if day == days[-1]:
+                    # half the codes first, as if the scraper were still
+                    # writing the day; the full re-read then revises it
+                    codes = batch["style_code"].unique()[::2]
+                    alerts.scan_rows("sole_supplier",
+                                     batch[batch["style_code"].isin(codes)], store)
+                found, seconds = timed(alerts.scan_rows, "sole_supplier", batch, store)
+                timings.append(seconds)
+                raised += len(found)
+                new_rows += len(batch)
+
+            # the running statistics match the full history
+            daily = rows.groupby(["date", "style_code"])["price"].mean()
+            expected = daily.groupby(level="style_code").agg(["count", "mean", "var"])
+            stats = store.stats("sole_supplier", expected.index).loc[expected.index]
+            np.testing.assert_allclose(
+                np.column_stack([stats["days"], stats["mean"],
+                                 stats["m2"] / (stats["days"] - 1)]),
+                expected.to_numpy(float), rtol=1e-9)
+
+        scan_ms = np.median(timings) * 1e3
+        per_scan = new_rows / len(timings)
+        record("alerts", size=size, days=n_days, seed_days=seed_days,
+               new_rows=per_scan, scan_ms=scan_ms, alerts=raised)
+        print(f"{size:>12} {per_scan:>9.0f} {scan_ms:>10.2f} {raised:>7}")
+
+
+def _import_profile(statement):
+    """Run `statement` in a fresh interpreter under `-X importtime`.
+
+    Returns its wall time in seconds and the cumulative milliseconds of each
+    top-level module it imported.
+    """
+    code = ("import time\nstart = time.perf_counter()\n"
+            f"{statement}\nprint(time.perf_counter() - start)")
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    modules = {}
+    for line in process.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # nested imports are indented
+            modules[name.strip()] = int(cumulative) / 1e3
+    return float(process.stdout.split()[-1]), modules
+
+
+def bench_imports(repeat=3, top=5):
+    """Cold import cost of the app shell and of each page on first use; the
+    shell plus the Home page is what a new session waits for before Home
+    can paint"""
+    import pages
+
+    print("Import time: app shell and each page on first use (fresh process)")
+    print(f"{'page':>12} {'import (s)':>11}  heaviest modules (ms)")
+    statements = {"shell": "import streamlit, streamlit_option_menu, pages, database"}
+    statements.update({
+        key: f"import pages\npages.registry[{key!r}].load()"
+        for key in pages.registry
+    })
+    for key, statement in statements.items():
+        runs = [_import_profile(statement) for _ in range(repeat)]
+        seconds, modules = min(runs, key=lambda run: run[0])
+        heaviest = sorted(modules.items(), key=lambda item: -item[1])[:top]
+        record("imports", page=key, import_s=seconds, heaviest_ms=dict(heaviest))
+        print(f"{key:>12} {seconds:>11.3f}  " + ", ".join(
+            f"{name} {ms:.0f}" for name, ms in heaviest))
+
+
+def write_json(path):
+    "Write the recorded measurements with enough context to compare runs"
+    report = {
+        "created": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(path, "w") as fp:
+        json.dump(report, fp, indent=2)
+
+
+benchmarks = {
+    "imports": lambda args: bench_imports(),
+    "scenarios": lambda args: bench_scenarios(args.scenario_sizes, args.days),
+    "price_metrics": lambda args: bench_price_metrics(args.sizes),
+    "fillna_mode": lambda args: bench_fillna_mode(args.fillna_sizes),
+    "suggest": lambda args: bench_suggest(args.suggest_sizes),
+    "cold_start": lambda args: bench_cold_start(args.cold_start_sizes),
+    "sql_engine": lambda args: bench_sql_engine(args.sql_sizes),
+    "incremental": lambda args: bench_incremental(args.incremental_sizes),
+    "memory": lambda args: bench_memory(args.memory_sizes),
+    "portfolio": lambda args: bench_portfolio(args.portfolio_sizes),
+    "alerts": lambda args: bench_alerts(args.alert_sizes),
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--only", nargs="+", choices=list(benchmarks),
+                        default=list(benchmarks))
+    parser.add_argument("--json", metavar="PATH",
+                        help="also write the measurements to PATH")
+    parser.add_argument("--scenario-sizes", type=int, nargs="+",
+                        default=[1_000, 10_000])
+    parser.add_argument("--days", type=int, default=365,
+                        help="days of history in the scenario tables")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1_000, 10_000, 100_000])
+    parser.add_argument("--fillna-sizes", type=int, nargs="+",
+                        default=[100, 1_000])
+    parser.add_argument("--suggest-sizes", type=int, nargs="+",
+                        default=[10_000, 100_000])
+    parser.add_argument("--cold-start-sizes", type=int, nargs="+",
+                        default=[1_000, 10_000])
+    # SQLite only checks SQL engine parity; it is much slower than Postgres
+    parser.add_argument("--sql-sizes", type=int, nargs="+", default=[1_000])
+    parser.add_argument("--incremental-sizes", type=int, nargs="+",
+                        default=[1_000])
+    parser.add_argument("--memory-sizes", type=int, nargs="+",
+                        default=[1_000, 10_000])
+    parser.add_argument("--portfolio-sizes", type=int, nargs="+",
+                        default=[10, 100, 1_000])
+    parser.add_argument("--alert-sizes", type=int, nargs="+",
+                        default=[1_000, 10_000])
+    args = parser.parse_args()
+    for name in args.only:
+        benchmarks[name](args)
+    if args.json:
+        write_json(args.json)
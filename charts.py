@@ -0,0 +1,125 @@
+"""Price history charts that stay light as histories grow.
+
+Long series are downsampled server-side with Largest-Triangle-Three-Buckets,
+which keeps the peaks and dips a reader looks for, and switch from SVG
+splines to WebGL traces once they are large. Finished figures are cached as
+plotly JSON per style code and store.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+from cachetools import TTLCache
+
+import telemetry
+
+# points per series sent to the browser unless full resolution is asked for
+chart_points = int(os.environ.get("CHART_POINTS", 500))
+# series longer than this are drawn with WebGL instead of SVG
+webgl_threshold = int(os.environ.get("CHART_WEBGL_THRESHOLD", 1000))
+
+_figures = TTLCache(
+    maxsize=int(os.environ.get("CHART_CACHE_SIZE", 128)),
+    ttl=float(os.environ.get("CHART_CACHE_TTL", 60 * 60)),
+)
+_figures_lock = threading.Lock()
+
+
+def lttb(x, y, threshold):
+    """Indices of the `threshold` points Largest-Triangle-Three-Buckets keeps.
+
+    `x` and `y` are numeric arrays sorted by `x`; the first and last points
+    are always kept. Points with a NaN `y` (a missing price) are never kept.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.flatnonzero(~np.isnan(y))
+    if len(finite) < len(y):
+        return finite[lttb(x[finite], y[finite], threshold)]
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(int) + 1
+    edges[-1] = n - 1
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        # twice the area of the triangle (previous, candidate, next average)
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.nanargmax(area)) if end > start else start
+        selected[i + 1] = previous
+    return selected
+
+
+def downsample(data, x="date", y="price", group=None, points=chart_points):
+    "Rows of `data` LTTB keeps for each series (one per `group` value)"
+    if group is not None:
+        return pd.concat(
+            [downsample(rows, x, y, None, points)
+             for _, rows in data.groupby(group, sort=False)],
+            ignore_index=True,
+        )
+    data = data.sort_values(by=x)
+    if len(data) <= points:
+        return data
+    xs = pd.to_datetime(data[x]).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    return data.iloc[lttb(xs, data[y].to_numpy(), points)]
+
+
+def price_chart(data, title, color=None, full_resolution=False):
+    "Line chart of `price` over `date`, one line per `color` value"
+    longest = data.groupby(color).size().max() if color else len(data)
+    if not full_resolution:
+        data = downsample(data, group=color)
+    webgl = longest > webgl_threshold
+    fig = px.line(
+        data,
+        x="date",
+        y="price",
+        color=color,
+        # scattergl has no spline interpolation
+        line_shape="linear" if webgl else "spline",
+        render_mode="webgl" if webgl else "svg",
+        color_discrete_sequence=px.colors.qualitative.G10,
+    )
+    fig.update_layout(title_text=title)
+    # fig.update_layout(
+    #     {"plot_bgcolor": "rgba(106, 245, 39, 0.96)"})
+    if color is None:
+        fig.update_traces(line={"color": "Black", "width": 2.5})
+    fig.update_xaxes(
+        minor=dict(ticks="inside", showgrid=True),
+        rangeslider_visible=True,
+    )
+    return fig
+
+
+def cached_price_chart(key, data, title, color=None, full_resolution=False):
+    """`price_chart` memoised as JSON under `key` (style code, store, ...).
+
+    The latest date and row count are part of the cache key, so new prices
+    produce a new chart.
+    """
+    key = (key, full_resolution, len(data), str(data["date"].max()))
+    with _figures_lock:
+        payload = _figures.get(key)
+    telemetry.count(
+        "cache", cache="chart", result="miss" if payload is None else "hit")
+    if payload is None:
+        with telemetry.span("chart.build"):
+            payload = price_chart(data, title, color, full_resolution).to_json()
+        with _figures_lock:
+            _figures[key] = payload
+    return pio.from_json(payload)
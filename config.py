@@ -1,24 +1,64 @@
 import os
 from dotenv import load_dotenv
 import psycopg2
-import sys
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+import telemetry
 
 load_dotenv(".env")
 
-db_host = os.environ["DB_HOST"]
-db_name = os.environ["DB_NAME"]
-db_password = os.environ["DB_PASSWORD"]
-db_port = os.environ["DB_PORT"]
-db_user = os.environ["DB_USER"]
+# read and checked on first use, so pages that never touch the database
+# start without them
+required_settings = ("DB_HOST", "DB_NAME", "DB_PASSWORD", "DB_PORT", "DB_USER")
+
+# connection pool settings
+db_pool_min = int(os.environ.get("DB_POOL_MIN", 1))
+db_pool_max = int(os.environ.get("DB_POOL_MAX", 10))
+db_pool_timeout = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+db_pool_health_check = float(os.environ.get("DB_POOL_HEALTH_CHECK", 30))
+db_connect_retries = int(os.environ.get("DB_CONNECT_RETRIES", 5))
+
+
+class ConfigError(Exception):
+    "Raised when a required setting is missing from the environment and .env"
+
+
+def check():
+    "Raise `ConfigError` naming every required setting that is missing"
+    missing = [name for name in required_settings if not os.environ.get(name)]
+    if missing:
+        raise ConfigError(
+            f"missing database settings: {', '.join(missing)} "
+            "(set them in the environment or in .env)")
+
+
+def __getattr__(name):
+    # db_host, db_name, ... are looked up when first asked for
+    if name.upper() in required_settings:
+        check()
+        return os.environ[name.upper()]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
+@retry(
+    retry=retry_if_exception_type(psycopg2.OperationalError),
+    stop=stop_after_attempt(db_connect_retries),
+    wait=wait_exponential(multiplier=0.5, max=8),
+    reraise=True,
+)
 def create_connection():
-    "Create Database Connection"
+    "Create Database Connection, retrying with exponential backoff"
 
-    host = db_host
-    dbname = db_name
-    user = db_user
-    password = db_password
+    check()
+    host = os.environ["DB_HOST"]
+    dbname = os.environ["DB_NAME"]
+    user = os.environ["DB_USER"]
+    password = os.environ["DB_PASSWORD"]
     sslmode = "require"
 
     # Constructing connection string
@@ -27,12 +67,13 @@ def create_connection():
     )
 
     try:
-        connection = psycopg2.connect(conn_string)
+        with telemetry.span("db.connect"):
+            connection = psycopg2.connect(conn_string)
         print("Connection established")
 
     except psycopg2.Error as e:
         print(f"Error connecting to Postgres DB : {e}")
-        sys.exit(1)
+        raise
 
     curr = connection.cursor()
     return connection, curr
@@ -1,17 +1,12 @@
-import numpy as np
 import pandas as pd
-import pandas.io.sql as psql
-import plotly.express as px
 import streamlit as st
-from config import create_connection
-from datetime import timedelta
-from forex_python.converter import CurrencyRates
-from utils import fillna_mode, style_negative, style_positive
-
-
-c = CurrencyRates()
-
-rate = c.get_rate('GBP', 'USD')
+import analytics
+import fx
+import leaderboard
+import precompute
+import telemetry
+from data import sole_supplier_leaderboard, window_metrics
+from utils import fillna_mode, style_signs
 
 pd.options.display.float_format = "${:,.2f}".format
 
@@ -25,202 +20,28 @@ def home():
     
     # -------------- sole_supplier SUPPLIER --------------
 
-    # create database connection
-    connection, _ = create_connection()
-
-    # read in data from database
-    query = """
-                SELECT 
-                    "date",
-                    style_code,
-                    product_title,
-                    ROUND(price,2) AS price,
-                    image_url
-                FROM sole_supplier
-            """
-    sole_supplier = psql.read_sql(query, connection)
-
-    # close connection
-    connection.close()
-
-    # data cleaning & transformation
-    sole_supplier["date"] = pd.to_datetime(sole_supplier["date"])
-    sole_supplier["date"] = sole_supplier["date"].dt.date
-    sole_supplier["price"] = sole_supplier["price"] * rate
-
-    sole_supplier_start_date = sole_supplier.date.min()
-    sole_supplier_end_date = sole_supplier.date.max()
-
-    # data analysis
-    sole_supplier.drop_duplicates(inplace=True)
-    sole_supplier.sort_values(by=["style_code", "date"], inplace=True)
-
-    sole_supplier_product_lst = list(
-        set(zip(sole_supplier["style_code"].values,
-            sole_supplier["product_title"].values))
-    )
-
-    sole_supplier_agg = sole_supplier.groupby(["style_code", "date"])[
-        "price"].mean().unstack().fillna(method="backfill", axis=1).copy()
-
-    num_days = (sole_supplier_end_date - sole_supplier_start_date).days
-
-    sole_supplier_agg["volatility"] = sole_supplier_agg.apply(
-        lambda x: (x.std()) / (num_days ** 0.5), axis=1)
-    # volatility = std / (365/T)**0.5
-    sole_supplier_agg["price_change"] = sole_supplier_agg.apply(
-        lambda x: round(
-            ((x[sole_supplier_end_date] - x[sole_supplier_start_date])),
-            2,
-        ),
-        axis=1,
-    )
-    try:
-        sole_supplier_agg["daily_pct"] = sole_supplier_agg.apply(
-            lambda x: round(
-                (
-                    (
-                        (x[sole_supplier_end_date] -
-                         x[sole_supplier_end_date - timedelta(days=1)])
-                        / x[sole_supplier_end_date - timedelta(days=1)]
-                    )
-                    * 100
-                ),
-                2,
-            ),
-            axis=1,
-        )
-    except:
-        pass
-
-    try:
-        sole_supplier_agg["weekly_pct"] = sole_supplier_agg.apply(
-            lambda x: round(
-                (
-                    (
-                        (x[sole_supplier_end_date] -
-                         x[sole_supplier_end_date - timedelta(days=7)])
-                        / x[sole_supplier_end_date - timedelta(days=7)]
-                    )
-                    * 100
-                ),
-                2,
-            ),
-            axis=1,
-        )
-    except:
-        pass
-
-    try:
-        sole_supplier_agg["total_pct"] = sole_supplier_agg.apply(
-            lambda x: round(
-                (((x[sole_supplier_end_date] - x[sole_supplier_start_date]
-                   ) / x[sole_supplier_start_date]) * 100),
-                2,
-            ),
-            axis=1,
-        )
-    except:
-        pass
-    sole_supplier_agg = sole_supplier_agg.sort_values(
-        by="volatility", ascending=False).reset_index()
-    sole_supplier_agg.columns.name = ""
-    
-    sole_supplier_agg["volatility"] = sole_supplier_agg.volatility.astype(
-        np.float32)
-    sole_supplier_agg["volatility"] = round(
-        np.log1p(sole_supplier_agg["volatility"]), 2)
-    sole_supplier_agg = sole_supplier_agg.sort_values(
-        by="volatility", ascending=False).reset_index(drop=True).copy()
-    sole_supplier_agg["product_title"] = sole_supplier_agg["style_code"].map(
-        dict(sole_supplier_product_lst))
-
-    if (("weekly_pct") not in list(sole_supplier_agg.columns)) & (("daily_pct") not in list(sole_supplier_agg.columns)):
-        sole_supplier_agg = sole_supplier_agg.drop(
-            columns=list(sole_supplier_agg.columns)[1:-6], axis=1)
-        sole_supplier_agg.rename(
-            columns={list(sole_supplier_agg.columns)[1]: "price"}, inplace=True)
-        sole_supplier_agg = sole_supplier_agg[
-            [
-                "product_title",
-                "style_code",
-                "price",
-                "price_change",
-                # "daily_pct",
-                # "weekly_pct",
-                "total_pct",
-                "volatility",
-            ]
-        ]
-
-    elif "daily_pct" not in list(sole_supplier_agg.columns):
-        sole_supplier_agg = sole_supplier_agg.drop(
-            columns=list(sole_supplier_agg.columns)[1:-6], axis=1)
-        sole_supplier_agg.rename(
-            columns={list(sole_supplier_agg.columns)[1]: "price"}, inplace=True)
-        sole_supplier_agg = sole_supplier_agg[
-            [
-                "product_title",
-                "style_code",
-                "price",
-                "price_change",
-                # "daily_pct",
-                "weekly_pct",
-                "total_pct",
-                "volatility",
-            ]
-        ]
-
-    elif "weekly_pct" not in list(sole_supplier_agg.columns):
-        sole_supplier_agg = sole_supplier_agg.drop(
-            columns=list(sole_supplier_agg.columns)[1:-6], axis=1)
-        sole_supplier_agg.rename(
-            columns={list(sole_supplier_agg.columns)[1]: "price"}, inplace=True)
-        sole_supplier_agg = sole_supplier_agg[
-            [
-                "product_title",
-                "style_code",
-                "price",
-                "price_change",
-                "daily_pct",
-                # "weekly_pct",
-                "total_pct",
-                "volatility",
-            ]
-        ]
-    
-    else:
-        sole_supplier_agg = sole_supplier_agg.drop(
-            columns=list(sole_supplier_agg.columns)[1:-7], axis=1)
-        sole_supplier_agg.rename(
-            columns={list(sole_supplier_agg.columns)[1]: "price"}, inplace=True)
-        sole_supplier_agg = sole_supplier_agg[
-            [
-                "product_title",
-                "style_code",
-                "price",
-                "price_change",
-                "daily_pct",
-                "weekly_pct",
-                "total_pct",
-                "volatility",
-            ]
-        ]
-
-    final_pct = sole_supplier_agg.sort_values(by="price_change", ascending=False).reset_index(
-        drop=True
-    )
-
-    reverse_pct = sole_supplier_agg.sort_values(by="price_change", ascending=True).reset_index(
-        drop=True
-    )
+    with telemetry.span("home.results"):
+        results = precompute.latest() if precompute.enabled else None
+        if results is not None:
+            # published by the precompute worker
+            sole_supplier_agg = results["leaderboard"]
+            sole_supplier_start_date = results["start_date"]
+            sole_supplier_end_date = results["end_date"]
+            final_pct = precompute.ranked(results, "gainers")
+            reverse_pct = precompute.ranked(results, "losers")
+            rate = results["rate"]
+        else:
+            rate = fx.rate("GBP", "USD")
+            sole_supplier_agg, sole_supplier_start_date, sole_supplier_end_date = \
+                sole_supplier_leaderboard(rate)
+            final_pct, reverse_pct = precompute.top_movers(sole_supplier_agg)
 
     st.subheader("Top 5 Sneakers Price Gain & Price Drop")
 
     col1, col2, col3, col4, col5 = st.columns(5)
     columns = [col1, col2, col3, col4, col5]
 
-    for i in range(5):
+    for i in range(len(final_pct)):
         with columns[i]:
             st.metric(
                 final_pct.iloc[i, 0],
@@ -228,7 +49,7 @@ def home():
                 f"{final_pct.iloc[i, 3]:,.2f}",
             )
 
-    for i in range(5):
+    for i in range(len(reverse_pct)):
         with columns[i]:
             st.metric(
                 reverse_pct.iloc[i, 0],
@@ -236,7 +57,7 @@ def home():
                 f"{reverse_pct.iloc[i, 3]:,.2f}",
             )
 
-    st.subheader("Top 10 Most Volatile Nike Dunk Sneakers")
+    st.subheader("Most Volatile Nike Dunk Sneakers")
     st.markdown(
         "$Volatility$ measures how the price of a sneaker varies from its average price over time. Fluctuation in price is a good indicator of sneakers that are relatively unstable. The sneakers with the highest volatility should be avoided to avert risk."
     )
@@ -255,175 +76,88 @@ def home():
     )
     st.markdown("- `volatility` represents the rate of fluctuation in price.")
 
-    st.dataframe(
-        sole_supplier_agg.head(10)
-        .style.hide()
-        .applymap(style_negative, props="color:red;")
-        .applymap(style_positive, props="color:green;")
+    filter_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+    with filter_col:
+        text = st.text_input(
+            "Filter by style code or name", key="leaderboard_filter")
+    with sort_col:
+        sort_by = st.selectbox(
+            "Sort by",
+            list(sole_supplier_agg.columns),
+            index=list(sole_supplier_agg.columns).index("volatility"),
+            key="leaderboard_sort",
+        )
+    with order_col:
+        order = st.radio("Order", ["desc", "asc"], key="leaderboard_order")
+    with size_col:
+        size = st.selectbox(
+            "Rows", [10, 25, 50, 100], key="leaderboard_size")
+
+    with telemetry.span("home.page"):
+        rows, matches, pages = leaderboard.page(
+            sole_supplier_agg,
+            sort_by=sort_by,
+            ascending=order == "asc",
+            text=text,
+            number=st.session_state.get("leaderboard_page", 1),
+            size=size,
+        )
+    # a narrower filter can leave the remembered page out of range
+    if st.session_state.get("leaderboard_page", 1) > pages:
+        st.session_state["leaderboard_page"] = pages
+    with telemetry.span("home.table"):
+        st.dataframe(
+            rows.style.hide()
+            .apply(style_signs, axis=None)
+        )
+    st.number_input(
+        "Page",
+        min_value=1,
+        max_value=pages,
+        step=1,
+        key="leaderboard_page",
     )
+    st.caption(f"{pages} pages, {matches} sneakers")
 
-def search():
-    st.write("All original NIke sneakers have tags attached to them with their sizes, barcodes, and model numbers. The model number of the sneaker is usually located under the size and above the barcode. Most times, it is a 6-digit number / alphabet followed by a 3-digit number / alphabet (e.g. DJ0950-113).  You can also find it in the description on retail sites or on the box.")
-    with st.form("sneaker_form", clear_on_submit=True):
-
-        stores = ["sole_supplier Supplier", "Goat"]
-        user_input = st.text_input(
-            label="Model Number",
-            max_chars=30,
-            key="unique_code",
-            placeholder="Enter your model number here ...",
+    st.subheader("Rolling Windows")
+    st.markdown(
+        "Prices over the chosen lookback, filtered like the table above. Days without scraped prices take the next day's prices.")
+    st.markdown(
+        "- `return_pct` represents the percentage change in price over the lookback.")
+    st.markdown(
+        "- `moving_average` represents the average price over the lookback.")
+    st.markdown(
+        "- `volatility` represents the standard deviation of daily returns, and `annualized_volatility` the same scaled to a year.")
+    st.markdown(
+        "- `max_drawdown` represents the deepest fall from a previous high within the lookback.")
+
+    window_col, window_sort_col = st.columns([3, 2])
+    with window_col:
+        window = st.radio(
+            "Lookback",
+            analytics.windows,
+            format_func=lambda days: f"{days} days",
+            horizontal=True,
+            key="analytics_window",
+        )
+    with window_sort_col:
+        window_sort = st.selectbox(
+            "Sort by",
+            analytics.columns[1:],
+            index=analytics.columns.index("annualized_volatility") - 1,
+            key="analytics_sort",
         )
-        stores = st.selectbox("Choose a retail store", stores)
-        submitted = st.form_submit_button("Submit")
-        style_code = st.session_state["unique_code"].upper()
-
-        if submitted & (len(style_code) > 0):
-            st.success("valid input")
-
-            # data validation
-            if (
-                isinstance(user_input, str)
-                & ("-" in style_code)
-                & (10 >= len(style_code) < 30)
-            ):
-                # create database connection
-                connection, _ = create_connection()
-
-                if stores == "sole_supplier Supplier":
-                    st.subheader("sole_supplier Supplier")
-                    # read in data from database
-                    query = f'''
-                                SELECT 
-                                    "date",
-                                    product_title,
-                                    price,
-                                    image_url
-                                FROM sole_supplier
-                                WHERE style_code='{style_code}'
-                            '''
-                    df = psql.read_sql(query, connection)
-
-                    # close connection
-                    connection.close()
-
-                    if (df.shape[0]) > 0:
-                        df["date"] = pd.to_datetime(df["date"])
-                        df["date"] = df["date"].dt.date
-                        df["price"] = df["price"].round(2) * rate
-                        title = df["product_title"].unique()[0]
-                        img = df["image_url"].unique()[0]
-                        data = df.sort_values(
-                            by="date", ascending=False).copy()
-                        # st.markdown(f"![{style_code} {title}]({img})")
-                        st.image(img)
-                        frame = data.describe().T
-                        frame["initial"] = list(data["price"])[0]
-                        frame["current"] = list(data["price"])[-1]
-                        frame["change"] = list(
-                            data["price"])[-1] - list(data["price"])[0]
-                        frame.rename(
-                            columns={
-                                "mean": "average",
-                                "std": "standard deviation",
-                                "max": "maximum",
-                                "min": "minimum",
-                            },
-                            inplace=True,
-                        )
-                        st.subheader("Summary Statistics")
-                        st.dataframe(
-                            frame.style.hide()
-                            .applymap(style_negative, props="color:red;")
-                            .applymap(style_positive, props="color:green;")
-                        )
-                        data = data[["date", "price"]]
-                        data = data.set_index("date")
-                        fig = px.line(
-                            data,
-                            y="price",
-                            line_shape="spline",
-                            render_mode="svg",
-                            color_discrete_sequence=px.colors.qualitative.G10,
-                        )
-                        fig.update_layout(
-                            title_text=f"{title} Price Change Over Time")
-                        # fig.update_layout(
-                        #     {"plot_bgcolor": "rgba(106, 245, 39, 0.96)"})
-                        fig.update_traces(
-                            line={"color": "Black", "width": 2.5})
-                        fig.update_xaxes(
-                            minor=dict(ticks="inside", showgrid=True),
-                            rangeslider_visible=True,
-                        )
-                        st.plotly_chart(fig, use_container_width=True)
-                    else:
-                        st.markdown(f"### {style_code} not found in database")
-                elif stores == "Goat":
-                    st.subheader("Goat")
-                    # read in data from database
-                    query = f'''
-                                SELECT 
-                                    "date",
-                                    product_title,
-                                    (retail_price_cents/100) AS price,
-                                    image_url
-                                FROM goat
-                                WHERE REPLACE(sku, '', '-')='{style_code}'
-                            '''
-                    df = psql.read_sql(query, connection)
-
-                    # close connection
-                    connection.close()
 
-                    if (df.shape[0]) > 0:
-                        df["date"] = pd.to_datetime(df["date"])
-                        df["date"] = df["date"].dt.date
-                        df["price"] = df["price"].round(2)
-                        title = df["product_title"].unique()[0]
-                        img = df["image_url"].unique()[0]
-                        data = df.sort_values(
-                            by="date", ascending=False).copy()
-                        # st.markdown(f"![{style_code} {title}]({img})")
-                        st.image(img)
-                        frame = data.describe().T
-                        frame["initial"] = list(data["price"])[0]
-                        frame["current"] = list(data["price"])[-1]
-                        frame["change"] = list(
-                            data["price"])[-1] - list(data["price"])[0]
-                        frame.rename(
-                            columns={
-                                "mean": "average",
-                                "std": "standard deviation",
-                                "max": "maximum",
-                                "min": "minimum",
-                            },
-                            inplace=True,
-                        )
-                        st.subheader("Summary Statistics")
-                        st.dataframe(
-                            frame.style.hide()
-                            .applymap(style_negative, props="color:red;")
-                            .applymap(style_positive, props="color:green;")
-                        )
-                        data = data[["date", "price"]]
-                        data = data.set_index("date")
-                        fig = px.line(
-                            data,
-                            y="price",
-                            line_shape="spline",
-                            render_mode="svg",
-                            color_discrete_sequence=px.colors.qualitative.G10,
-                        )
-                        fig.update_layout(
-                            title_text=f"{title} Price Change Over Time")
-                        # fig.update_layout(
-                        #     {"plot_bgcolor": "rgba(106, 245, 39, 0.96)"})
-                        fig.update_traces(
-                            line={"color": "Black", "width": 2.5})
-                        fig.update_xaxes(
-                            minor=dict(ticks="inside", showgrid=True),
-                            rangeslider_visible=True,
-                        )
-                        st.plotly_chart(fig, use_container_width=True)
-                    else:
-                        st.markdown(f"### {style_code} not found in database")
+    with telemetry.span("home.analytics"):
+        if results is not None and window in results["windows"]:
+            metrics = results["windows"][window]
+        else:
+            metrics = window_metrics(window, rate)
+        metrics = sole_supplier_agg[["product_title", "style_code"]].merge(
+            metrics, on="style_code")
+        window_rows, _, _ = leaderboard.page(
+            metrics, sort_by=window_sort, text=text, size=size)
+    st.dataframe(
+        window_rows.style.hide()
+        .apply(style_signs, axis=None)
+    )
@@ -0,0 +1,207 @@
+import os
+import threading
+from cachetools import TTLCache
+
+import analytics
+import loading
+import snapshot
+import telemetry
+
+from database import connection
+from ingest import IncrementalLoader
+from metrics import daily_pivot, price_metrics, rank_by_volatility
+from sql_engine import read_leaderboard
+
+# results are shared by every session until they expire or the table changes
+cache_ttl = float(os.environ.get("DATA_CACHE_TTL", 6 * 60 * 60))
+cache_size = int(os.environ.get("DATA_CACHE_SIZE", 16))
+# how long a "has the table changed?" probe result is trusted
+probe_ttl = float(os.environ.get("DATA_PROBE_TTL", 60))
+# "incremental" folds only new days into running aggregates, "full" reloads,
+# "sql" aggregates in Postgres and "sql_view" reads its materialized view
+home_engine = os.environ.get("HOME_ENGINE", "incremental")
+
+_cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+_probes = TTLCache(maxsize=cache_size, ttl=probe_ttl)
+_cache_lock = threading.Lock()
+_key_locks = {}
+_loader = IncrementalLoader()
+
+
+def cached(key, compute):
+    """Return `compute()` memoised under `key` in the shared TTL cache.
+
+    Concurrent callers missing on the same key wait for a single computation
+    instead of each running it.
+    """
+    with _cache_lock:
+        if key in _cache:
+            telemetry.count("cache", cache="data", result="hit")
+            return _cache[key]
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        with _cache_lock:
+            if key in _cache:
+                telemetry.count("cache", cache="data", result="hit")
+                return _cache[key]
+        telemetry.count("cache", cache="data", result="miss")
+        try:
+            value = compute()
+            with _cache_lock:
+                _cache[key] = value
+        finally:
+            with _cache_lock:
+                _key_locks.pop(key, None)
+        return value
+
+
+def table_version(table):
+    """Cheap change probe: the table's latest `date` and that day's row count.
+
+    Cache keys include this version, so new scraper rows invalidate results
+    without a full reload on every page view. Both parts are served by the
+    `"date"` index (`stores.create_indexes`), and counting the latest day
+    still catches rows added to a day already seen.
+    """
+    with _cache_lock:
+        if table in _probes:
+            telemetry.count("cache", cache="probe", result="hit")
+            return _probes[table]
+    telemetry.count("cache", cache="probe", result="miss")
+    query = f"""
+        SELECT MAX("date") AS max_date, COUNT(*) AS row_count
+        FROM {table}
+        WHERE "date" = (SELECT MAX("date") FROM {table})
+    """
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query)
+            version = tuple(str(value) for value in cursor.fetchone())
+    with _cache_lock:
+        _probes[table] = version
+    return version
+
+
+def _read_sole_supplier():
+    with telemetry.span("home.read"):
+        return telemetry.frame("home.read", _fetch_sole_supplier())
+
+
+def _fetch_sole_supplier():
+    if snapshot.enabled:
+        snapshot.sole_supplier.sync(force=True)
+        return snapshot.sole_supplier.read(loading.views["home"], typed=True)
+
+    # read in data from database; dates and types are cleaned per chunk
+    query = """
+                SELECT 
+                    "date",
+                    style_code,
+                    product_title,
+                    ROUND(price,2) AS price,
+                    image_url
+                FROM sole_supplier
+            """
+    with connection() as conn:
+        return loading.read_sql(query, conn)
+
+
+def load_sole_supplier():
+    """`sole_supplier` price history with the Home columns and compact types
+    (shared, treat as read-only)"""
+    version = table_version("sole_supplier")
+    return cached(("sole_supplier", version), _read_sole_supplier)
+
+
+def aggregate_sole_supplier(sole_supplier, rate):
+    """Build the per-product leaderboard from the raw price history.
+
+    Returns the aggregate frame with the first and last dates of the history.
+    """
+    sole_supplier_start_date = sole_supplier.date.min()
+    sole_supplier_end_date = sole_supplier.date.max()
+
+    # data analysis; the shared frame is never copied or modified, and the
+    # rate is applied to the much smaller pivot
+    titles = sole_supplier.groupby("style_code", observed=True)[
+        "product_title"].last()
+
+    with telemetry.span("leaderboard.pivot"):
+        sole_supplier_agg = daily_pivot(sole_supplier).bfill(axis=1) * rate
+
+    with telemetry.span("leaderboard.metrics"):
+        sole_supplier_agg = price_metrics(
+            sole_supplier_agg, sole_supplier_start_date, sole_supplier_end_date)
+        sole_supplier_agg["product_title"] = sole_supplier_agg.index.map(
+            titles.astype(object))
+        sole_supplier_agg = rank_by_volatility(sole_supplier_agg)
+
+    return sole_supplier_agg, sole_supplier_start_date, sole_supplier_end_date
+
+
+def _incremental_leaderboard(rate):
+    _loader.refresh(snapshot.sole_supplier if snapshot.enabled else None)
+    return _loader.leaderboard(rate)
+
+
+def _sql_leaderboard(rate, from_view):
+    with connection() as conn:
+        return read_leaderboard(conn, rate, from_view=from_view)
+
+
+def compute_leaderboard(rate):
+    "Home leaderboard from the configured engine, bypassing the result cache"
+    with telemetry.span(f"leaderboard.{home_engine}"):
+        if home_engine in ("sql", "sql_view"):
+            result = _sql_leaderboard(rate, from_view=home_engine == "sql_view")
+        elif home_engine == "incremental":
+            result = _incremental_leaderboard(rate)
+        else:
+            result = aggregate_sole_supplier(load_sole_supplier(), rate)
+    telemetry.frame("home.leaderboard", result[0])
+    return result
+
+
+def _price_rows():
+    # the incremental loader already keeps one mean price per product and day
+    if home_engine == "incremental":
+        _loader.refresh(snapshot.sole_supplier if snapshot.enabled else None)
+        return _loader.history
+    return load_sole_supplier()
+
+
+def build_price_matrix():
+    """Calendar-aligned daily `style_code` x `date` price matrix in GBP,
+    bypassing the result cache"""
+    with telemetry.span("analytics.matrix"):
+        return analytics.calendar(daily_pivot(_price_rows()).bfill(axis=1))
+
+
+def price_matrix():
+    "Cached `build_price_matrix` for the current table version"
+    version = table_version("sole_supplier")
+    return cached(("price_matrix", version), build_price_matrix)
+
+
+def window_metrics(window, rate):
+    """Cached rolling-window metrics of one lookback.
+
+    Each window is cached on its own on top of the shared price matrix, so
+    switching lookbacks only computes a window the first time it is asked
+    for.
+    """
+    version = table_version("sole_supplier")
+
+    def compute():
+        with telemetry.span(f"analytics.window_{window}"):
+            return analytics.window_metrics(price_matrix(), window, rate)
+
+    return cached(("window", version, window, rate), compute)
+
+
+def sole_supplier_leaderboard(rate):
+    "Cached Home leaderboard for the current table version"
+    version = table_version("sole_supplier")
+    return cached(
+        (home_engine, version, rate), lambda: compute_leaderboard(rate))
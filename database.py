@@ -0,0 +1,180 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+import telemetry
+
+
+class PoolTimeout(Exception):
+    "Raised when no pooled connection frees up within the wait limit"
+
+
+class ConnectionPool:
+    """Thread-safe pool of reusable database connections.
+
+    Connections are created lazily up to `maxconn`, health checked before they
+    are handed out and returned to the pool when the caller is done, so a page
+    rerun reuses an open connection instead of paying a new TLS handshake.
+    """
+
+    def __init__(self, connect, minconn=1, maxconn=10, timeout=10.0,
+                 health_check=30.0):
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check = health_check
+
+        self._lock = threading.Condition()
+        self._idle = []  # [(connection, last_used)]
+        self._in_use = 0
+        self._waiting = 0
+        self._connects = 0
+        self._connect_time = 0.0
+        self._discarded = 0
+
+        for _ in range(minconn):
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    def _new_connection(self):
+        start = time.perf_counter()
+        connection, _ = self._connect()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._connects += 1
+            self._connect_time += elapsed
+        return connection
+
+    def _healthy(self, connection, last_used):
+        "Check a connection before reuse, pinging it if it has idled a while"
+        if connection.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self):
+        "Check out a connection, waiting at most `timeout` seconds for one"
+        with telemetry.span("db.acquire"):
+            return self._checkout()
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            self._waiting += 1
+            try:
+                while not self._idle and self._in_use >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"no database connection free after {self.timeout}s")
+                    self._lock.wait(remaining)
+                self._in_use += 1
+                item = self._idle.pop() if self._idle else None
+            finally:
+                self._waiting -= 1
+
+        try:
+            if item is not None:
+                connection, last_used = item
+                if self._healthy(connection, last_used):
+                    return connection
+                self._close(connection)
+            return self._new_connection()
+        except BaseException:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+    def putconn(self, connection):
+        "Return a connection to the pool, dropping it if it is broken"
+        keep = not connection.closed
+        if keep:
+            try:
+                connection.rollback()
+            except Exception:
+                keep = False
+        if not keep:
+            self._close(connection)
+        with self._lock:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+    def _close(self, connection):
+        with self._lock:
+            self._discarded += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        "Borrow a connection for the duration of a `with` block"
+        connection = self.getconn()
+        try:
+            yield connection
+        finally:
+            self.putconn(connection)
+
+    def closeall(self):
+        "Close every idle connection"
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            connection.close()
+
+    def stats(self):
+        "Snapshot of pool usage and connect latency"
+        with self._lock:
+            return {
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "max_size": self.maxconn,
+                "connects": self._connects,
+                "discarded": self._discarded,
+                "avg_connect_ms": round(
+                    self._connect_time / self._connects * 1000, 2)
+                if self._connects else 0.0,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    "Return the process-wide pool shared by every Streamlit session"
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    config.create_connection,
+                    minconn=config.db_pool_min,
+                    maxconn=config.db_pool_max,
+                    timeout=config.db_pool_timeout,
+                    health_check=config.db_pool_health_check,
+                )
+    return _pool
+
+
+def connection():
+    "Borrow a pooled connection: `with database.connection() as conn: ...`"
+    return get_pool().connection()
+
+
+def pool_stats():
+    "Current stats of the shared pool, or None before it is first used"
+    return _pool.stats() if _pool is not None else None
@@ -0,0 +1,249 @@
+"""Currency conversion with cached, locally persisted exchange rates.
+
+Rates are looked up lazily, kept per date and written to disk, so a new
+process can serve prices from the last known rates without touching the
+network. Stale "latest" rates keep being served while a background thread
+refreshes them. A rate that was never fetched is waited for at most
+`FX_TIMEOUT` seconds; after that `FX_DEFAULT_<BASE>_<TARGET>` (e.g.
+`FX_DEFAULT_GBP_USD`) is used, or `FxError` raised when it is not set.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+cache_path = os.environ.get("FX_CACHE_PATH", os.path.join(".cache", "fx_rates.json"))
+# how long a "latest" rate is trusted before a background refresh
+latest_ttl = float(os.environ.get("FX_TTL", 6 * 60 * 60))
+# convert historical prices at each row's own date instead of today's rate
+historical = os.environ.get("FX_HISTORICAL", "0") == "1"
+# seconds a page waits for a rate that is not cached yet
+fetch_timeout = float(os.environ.get("FX_TIMEOUT", 5))
+# seconds after which a fetch that has not finished is presumed hung
+fetch_expiry = float(os.environ.get("FX_FETCH_EXPIRY", 60))
+# fallback rates while nothing is cached, e.g. FX_DEFAULT_GBP_USD=1.2
+default_rates = {
+    tuple(name[len("FX_DEFAULT_"):].split("_", 1)): float(value)
+    for name, value in os.environ.items() if name.startswith("FX_DEFAULT_")
+}
+
+
+class FxError(Exception):
+    "No exchange rate could be fetched and no default is configured"
+
+
+class RateProvider:
+    "Source of exchange rates; `day=None` asks for the latest rate"
+
+    def get_rate(self, base, target, day=None):
+        raise NotImplementedError
+
+
+class ForexPythonProvider(RateProvider):
+    "Rates from the forex_python web service"
+
+    def get_rate(self, base, target, day=None):
+        from forex_python.converter import CurrencyRates
+
+        when = datetime.combine(day, datetime.min.time()) if day else None
+        return float(CurrencyRates().get_rate(base, target, when))
+
+
+class FixtureProvider(RateProvider):
+    """Offline rates for tests and benchmarks.
+
+    `rates` maps `(base, target)` to a rate, or to a `{date: rate}` dict for
+    date-dependent fixtures (the latest date doubles as the latest rate).
+    """
+
+    def __init__(self, rates):
+        self.rates = rates
+
+    def get_rate(self, base, target, day=None):
+        rate = self.rates[(base, target)]
+        if not isinstance(rate, dict):
+            return float(rate)
+        return float(rate[day if day is not None else max(rate)])
+
+
+def _key(base, target, day):
+    return f"{base}:{target}:{day.isoformat() if day else 'latest'}"
+
+
+class FxService:
+    "Per-date rate cache in front of a `RateProvider`"
+
+    def __init__(self, provider, path=None, ttl=latest_ttl, timeout=fetch_timeout,
+                 expiry=fetch_expiry):
+        self.provider = provider
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self.expiry = expiry
+        self._rates = None  # key -> {"rate": float, "fetched": epoch seconds}
+        # key -> (Event set once the fetch has finished, monotonic start)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._rates is not None:
+            return
+        rates = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as fp:
+                    rates = json.load(fp)
+            except (OSError, ValueError):
+                rates = {}
+        self._rates = rates
+
+    def _save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as fp:
+            json.dump(self._rates, fp)
+        os.replace(tmp, self.path)
+
+    def _fetch(self, base, target, day):
+        rate = self.provider.get_rate(base, target, day)
+        with self._lock:
+            self._load()
+            self._rates[_key(base, target, day)] = {
+                "rate": rate, "fetched": time.time()}
+            self._save()
+        return rate
+
+    def _fetch_in_background(self, base, target, days):
+        """Fetch rates for `days` one after another on a daemon thread.
+
+        Days already being fetched are skipped, unless that fetch started
+        more than `expiry` seconds ago: the provider has no request timeout,
+        so such a fetch is presumed hung and tried again.
+        """
+        now = time.monotonic()
+        with self._lock:
+            keys = {_key(base, target, day): day for day in days}
+            keys = {key: day for key, day in keys.items()
+                    if key not in self._pending
+                    or now - self._pending[key][1] > self.expiry}
+            if not keys:
+                return
+            events = {key: threading.Event() for key in keys}
+            self._pending.update({key: (events[key], now) for key in keys})
+
+        def run():
+            for key, day in keys.items():
+                try:
+                    self._fetch(base, target, day)
+                except Exception as e:
+                    print(f"Error fetching {key} exchange rate : {e}")
+                finally:
+                    with self._lock:
+                        # a retry may have replaced the entry meanwhile
+                        if self._pending.get(key, (None,))[0] is events[key]:
+                            del self._pending[key]
+                    events[key].set()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _fetch_within_timeout(self, base, target, day):
+        """Fetched rate, or None when the provider failed or took longer than
+        `timeout`; every caller waits on the same fetch"""
+        self._fetch_in_background(base, target, [day])
+        with self._lock:
+            pending = self._pending.get(_key(base, target, day))
+        if pending is not None:
+            pending[0].wait(self.timeout)
+        known = self._known(base, target, day)
+        return known["rate"] if known is not None else None
+
+    def _default(self, base, target):
+        rate = default_rates.get((base, target))
+        if rate is None:
+            raise FxError(
+                f"No {base} to {target} exchange rate: it could not be fetched "
+                f"within {self.timeout:g}s and "
+                f"FX_DEFAULT_{base}_{target} is not set")
+        print(f"Using the default {base} to {target} exchange rate {rate}")
+        return rate
+
+    def _known(self, base, target, day):
+        with self._lock:
+            self._load()
+            return self._rates.get(_key(base, target, day))
+
+    def rate(self, base, target, day=None):
+        """Rate from `base` to `target` on `day` (latest when None).
+
+        Only blocks, for up to `timeout` seconds, when the rate has never
+        been fetched; an expired latest rate is returned as is and refreshed
+        in the background.
+        """
+        if base == target:
+            return 1.0
+        known = self._known(base, target, day)
+        if known is None:
+            rate = self._fetch_within_timeout(base, target, day)
+            return rate if rate is not None else self._default(base, target)
+        if day is None and time.time() - known["fetched"] > self.ttl:
+            self._fetch_in_background(base, target, [day])
+        return known["rate"]
+
+    def convert(self, prices, dates, base, target):
+        """Convert each price at the rate of its own date without blocking.
+
+        Dates whose rate is not cached yet use the latest rate for now and are
+        fetched in the background.
+        """
+        if base == target:
+            return prices.astype(float)
+        latest = self.rate(base, target)
+        days = pd.to_datetime(pd.Series(list(dates))).dt.date
+        rates, missing = {}, []
+        for day in days.unique():
+            known = self._known(base, target, day)
+            if known is None:
+                missing.append(day)
+                rates[day] = latest
+            else:
+                rates[day] = known["rate"]
+        if missing:
+            self._fetch_in_background(base, target, missing)
+        return prices.astype(float) * days.map(rates).to_numpy()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    "Process-wide service, created on first use"
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = FxService(ForexPythonProvider(), path=cache_path)
+    return _service
+
+
+def set_service(service):
+    "Swap in another service, e.g. one backed by a `FixtureProvider`"
+    global _service
+    _service = service
+
+
+def rate(base, target, day=None):
+    "Rate from `base` to `target` through the shared service"
+    return get_service().rate(base, target, day)
+
+
+def convert(prices, dates, base, target):
+    "Convert prices at their own dates through the shared service"
+    return get_service().convert(prices, dates, base, target)
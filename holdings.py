@@ -0,0 +1,165 @@
+"""Valuation of uploaded sneaker holdings.
+
+Holdings are read from CSV a chunk at a time. The style codes of a chunk
+are priced with one query per store (`Store.batch_query`, served by the same
+expression index as single lookups) and the chunk is valued in one
+vectorized pass, so a chunk costs about the same however many holdings it
+has. Quotes are cached per style code and table version, so repeated codes
+and reruns of the page are only fetched once until new prices arrive.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pandas.io.sql as psql
+from cachetools import TTLCache
+
+import analytics
+import loading
+import telemetry
+from data import table_version
+from database import connection
+from metrics import daily_pivot, pct_change
+from stores import normalize_style_code, prepare, registry
+
+chunk_size = int(os.environ.get("PORTFOLIO_CHUNK_SIZE", 500))
+# lookback of the per-holding volatility, in days
+volatility_window = 90
+
+required_columns = ["style_code", "purchase_price"]
+quote_columns = ["price", "volatility", "as_of"]
+
+_quotes = TTLCache(
+    maxsize=int(os.environ.get("PORTFOLIO_CACHE_SIZE", 10_000)),
+    ttl=float(os.environ.get("PORTFOLIO_CACHE_TTL", 60 * 60)),
+)
+_quotes_lock = threading.Lock()
+
+
+def read_holdings(file, chunksize=chunk_size):
+    """Holdings from a CSV, `chunksize` rows at a time.
+
+    Needs `style_code` and `purchase_price` columns; `size` and `quantity`
+    (default 1) are optional. Headers are matched case-insensitively and
+    style codes are normalized like the Search page does.
+    """
+    for chunk in pd.read_csv(file, chunksize=chunksize, dtype=str):
+        chunk.columns = [
+            column.strip().lower().replace(" ", "_") for column in chunk.columns]
+        missing = [column for column in required_columns
+                   if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"missing CSV columns: {', '.join(missing)}")
+        chunk = chunk.dropna(subset=["style_code"])
+        chunk = chunk.reindex(columns=["style_code", "size", "quantity",
+                                       "purchase_price"])
+        chunk["style_code"] = chunk["style_code"].map(normalize_style_code)
+        chunk["size"] = chunk["size"].fillna("")
+        chunk["quantity"] = pd.to_numeric(
+            chunk["quantity"], errors="coerce").fillna(1.0).astype(float)
+        chunk["purchase_price"] = pd.to_numeric(
+            chunk["purchase_price"], errors="coerce").astype(float)
+        yield chunk
+
+
+def fetch(store, codes):
+    "`date, style_code, price` history of every code in `codes`, in one read"
+    local = registry[store].snapshot
+    if local is not None:
+        local.sync()
+        return local.read(["date", "style_code", "price"],
+                          filters=[(local.key, "in", list(codes))])
+    with connection() as conn:
+        return psql.read_sql(registry[store].batch_query, conn,
+                             params={"style_codes": list(codes)})
+
+
+def quote(store, history, window=volatility_window):
+    """Latest price in the display currency, its date and the annualized
+    volatility over `window` days of each style code in a `fetch` result"""
+    if history.empty:
+        return pd.DataFrame(
+            columns=quote_columns, index=pd.Index([], name="style_code"))
+    history = loading.compact(prepare(store, history))
+    matrix = analytics.calendar(daily_pivot(history).bfill(axis=1))
+
+    # right-align each history on its last scraped price, so a code the
+    # store stopped listing is measured over its own last `window` days
+    values = matrix.to_numpy(dtype=float)
+    width = values.shape[1]
+    last = width - 1 - np.argmax(~np.isnan(values)[:, ::-1], axis=1)
+    positions = np.arange(width) - (width - 1 - last)[:, None]
+    aligned = np.where(
+        positions >= 0,
+        values[np.arange(len(values))[:, None], np.maximum(positions, 0)],
+        np.nan,
+    )
+    metrics = analytics.window_metrics(
+        pd.DataFrame(aligned, index=matrix.index), window)
+    quotes = pd.DataFrame(
+        {
+            "price": metrics["price"].to_numpy(),
+            "volatility": metrics["annualized_volatility"].to_numpy(),
+            "as_of": np.asarray(matrix.columns, dtype=object)[last],
+        },
+        index=pd.Index(matrix.index.astype(object), name="style_code"),
+    )
+    return quotes
+
+
+def quotes(store, codes):
+    """`quote` of every code in `codes`, fetching the uncached ones together.
+
+    Codes `store` does not list are cached as missing (NaN price) too.
+    """
+    version = table_version(registry[store].table)
+    with _quotes_lock:
+        known = {code: _quotes.get((store, code, version)) for code in codes}
+    missing = [code for code, values in known.items() if values is None]
+    telemetry.count("cache", len(codes) - len(missing),
+                    cache="portfolio", result="hit")
+    telemetry.count("cache", len(missing), cache="portfolio", result="miss")
+    if missing:
+        with telemetry.span(f"portfolio.fetch.{store}"):
+            history = fetch(store, missing)
+        fresh = quote(store, history)
+        for code in missing:
+            known[code] = tuple(fresh.loc[code]) if code in fresh.index \
+                else (np.nan, np.nan, None)
+        with _quotes_lock:
+            for code in missing:
+                _quotes[(store, code, version)] = known[code]
+    return pd.DataFrame.from_dict(known, orient="index", columns=quote_columns)
+
+
+def value(holdings, quotes):
+    "Current value, unrealized P&L and volatility of each holding"
+    frame = holdings.join(quotes, on="style_code")
+    cost = frame["purchase_price"] * frame["quantity"]
+    frame["value"] = (frame["price"] * frame["quantity"]).round(2)
+    frame["pnl"] = (frame["value"] - cost).round(2)
+    frame["pnl_pct"] = pct_change(frame["value"], cost)
+    return frame
+
+
+def stream(file, store, chunksize=chunk_size):
+    "Valued holdings of a CSV upload, one chunk at a time"
+    for chunk in read_holdings(file, chunksize):
+        with telemetry.span("portfolio.chunk"):
+            yield value(chunk, quotes(store, chunk["style_code"].unique()))
+
+
+def summary(valued):
+    "Totals over the holdings that could be priced"
+    priced = valued[valued["price"].notna()]
+    cost = (priced["purchase_price"] * priced["quantity"]).sum()
+    total = priced["value"].sum()
+    return {
+        "holdings": len(valued),
+        "priced": len(priced),
+        "cost": round(cost, 2),
+        "value": round(total, 2),
+        "pnl": round(total - cost, 2),
+        "pnl_pct": round((total - cost) / cost * 100, 2) if cost else np.nan,
+    }
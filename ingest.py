@@ -0,0 +1,225 @@
+import threading
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import loading
+from database import connection
+from metrics import price_on, pct_change, rank_by_volatility
+
+
+class IncrementalLoader:
+    """Keeps the `sole_supplier` history locally and only fetches new days.
+
+    Each refresh reads rows with `"date"` from the last seen watermark on and
+    folds them into per-`style_code` running aggregates, so the cost of a
+    refresh depends on the new rows rather than on the whole history. The
+    latest day is provisional, since the scraper may still be writing it:
+    its raw rows and the aggregates from before it are kept, and rows that
+    arrive later for that day roll it back and apply it again.
+
+    The aggregates reproduce the Home leaderboard built from the backfilled
+    `style_code` x `date` pivot: a day a product is missing takes its next
+    observed price, which is why each update carries a weight equal to the
+    number of pivot columns it covers.
+    """
+
+    stat_columns = [
+        "product_title",
+        "start_price",
+        "last_idx",
+        "last_price",
+        "weight",
+        "mean",
+        "m2",
+    ]
+
+    def __init__(self, table="sole_supplier", recent_days=7):
+        self.table = table
+        self.recent_days = recent_days
+        self.watermark = None
+        self.dates = []
+        # daily mean price per style code, the local snapshot of history
+        self.history = pd.DataFrame(columns=["date", "style_code", "price"])
+        self.stats = pd.DataFrame(columns=self.stat_columns)
+        self.stats.index.name = "style_code"
+        # backfill source for the 1-day and 7-day lookups
+        self.recent = pd.DataFrame()
+        # raw rows of the provisional latest day and the state before it
+        self.provisional = None
+        self._before = None
+        # held by refresh, append and leaderboard; refresh calls append
+        self._lock = threading.RLock()
+
+    def fetch(self):
+        "Read the rows dated on or after the watermark from the database"
+        query = f"""
+                    SELECT
+                        "date",
+                        style_code,
+                        product_title,
+                        ROUND(price,2) AS price,
+                        image_url
+                    FROM {self.table}
+                """
+        params = None
+        if self.watermark is not None:
+            query += ' WHERE "date" >= %(watermark)s'
+            params = {"watermark": self.watermark}
+        with connection() as conn:
+            return loading.read_sql(query, conn, params=params)
+
+    def refresh(self, snapshot=None):
+        """Fetch and apply new rows, returning how many arrived.
+
+        With a `snapshot.Snapshot`, a cold loader is seeded from disk and the
+        snapshot's own watermark sync supplies the new rows.
+        """
+        with self._lock:
+            if snapshot is None:
+                rows = self.fetch()
+            else:
+                if self.watermark is None:
+                    self.append(snapshot.read(loading.views["home"], typed=True))
+                rows = snapshot.sync(force=True)
+            self.append(rows)
+            return len(rows)
+
+    def append(self, rows):
+        """Fold a batch of raw rows into the aggregates; rows dated before the
+        watermark are ignored and rows of the watermark day revise it"""
+        with self._lock:
+            self._append(rows)
+
+    def _append(self, rows):
+        if rows.empty:
+            return
+        # typed like the provisional rows, so a re-read row is found again
+        rows = loading.compact(rows.drop_duplicates())
+        if self.watermark is not None:
+            later = loading.later_than(rows["date"], self.watermark)
+            revised = rows[~later & loading.later_than(
+                rows["date"], self.watermark - timedelta(days=1))]
+            rows = rows[later]
+            if len(revised):
+                merged = loading.concat([self.provisional, revised]).drop_duplicates()
+                if len(merged) > len(self.provisional):
+                    self._rollback()
+                    rows = loading.concat([merged, rows])
+        if rows.empty:
+            return
+        last = rows["date"] == rows["date"].max()
+        self._fold(rows[~last])
+        self._before = (self.stats.copy(), self.recent, len(self.dates),
+                        len(self.history), self.watermark)
+        self.provisional = rows[last]
+        self._fold(self.provisional)
+
+    def _rollback(self):
+        "Undo the provisional day, to apply it again with its new rows"
+        stats, self.recent, days, history, self.watermark = self._before
+        self.stats = stats.copy()
+        del self.dates[days:]
+        self.history = self.history.iloc[:history]
+
+    def _fold(self, rows):
+        if rows.empty:
+            return
+        titles = rows.groupby("style_code", observed=True)["product_title"].last()
+        daily = rows.groupby(["date", "style_code"], observed=True)["price"].mean()
+
+        for date, prices in daily.groupby(level="date", observed=True):
+            prices = prices.droplevel("date")
+            # per-day work stays on plain labels; it is a product's worth of rows
+            prices.index = prices.index.astype(object)
+            self._apply_day(date, prices)
+
+        self.stats.loc[titles.index.astype(object), "product_title"] = \
+            titles.astype(object).to_numpy()
+        self.history = loading.concat([
+            self.history,
+            loading.compact(daily.reset_index()[["date", "style_code", "price"]]),
+        ])
+        self.watermark = self.dates[-1]
+
+    def _apply_day(self, date, prices):
+        idx = len(self.dates)
+        self.dates.append(date)
+        stats = self.stats
+
+        # weighted Welford update for products already seen
+        known = prices.index.intersection(stats.index)
+        x = prices[known].astype(float)
+        weight = stats.loc[known, "weight"].astype(float)
+        mean = stats.loc[known, "mean"].astype(float)
+        w = idx - stats.loc[known, "last_idx"].astype(float)
+        total = weight + w
+        delta = x - mean
+        stats.loc[known, "mean"] = mean + delta * w / total
+        stats.loc[known, "m2"] = (
+            stats.loc[known, "m2"].astype(float) + delta ** 2 * weight * w / total)
+        stats.loc[known, "weight"] = total
+        stats.loc[known, "last_idx"] = idx
+        stats.loc[known, "last_price"] = x
+
+        # a new product backfills every earlier column with its first price
+        new = prices.index.difference(stats.index)
+        if len(new):
+            first = prices[new].astype(float)
+            added = pd.DataFrame(
+                {
+                    "product_title": None,
+                    "start_price": first,
+                    "last_idx": idx,
+                    "last_price": first,
+                    "weight": float(idx + 1),
+                    "mean": first,
+                    "m2": 0.0,
+                },
+                index=new,
+            )
+            stats = pd.concat([stats, added]) if len(stats) else added
+            stats.index.name = "style_code"
+        self.stats = stats
+
+        recent = pd.concat([self.recent, prices.rename(date)], axis=1)
+        cutoff = date - timedelta(days=self.recent_days)
+        self.recent = recent[[column for column in recent.columns
+                              if column >= cutoff]]
+
+    def leaderboard(self, rate):
+        """Home leaderboard computed from the running aggregates.
+
+        Returns the same frame and dates as `data.aggregate_sole_supplier`.
+        """
+        # `_apply_day` updates the stats in place; never read a half-applied day
+        with self._lock:
+            return self._leaderboard(rate)
+
+    def _leaderboard(self, rate):
+        stats = self.stats
+        start_date, end_date = self.dates[0], self.dates[-1]
+        num_days = (end_date - start_date).days
+        end_idx = len(self.dates) - 1
+
+        start = stats["start_price"].astype(float) * rate
+        latest = stats["last_price"].astype(float).where(
+            stats["last_idx"] == end_idx) * rate
+        weight = stats["weight"].astype(float)
+        std = np.sqrt(stats["m2"].astype(float) / (weight - 1)).where(weight > 1)
+        std = std * rate
+
+        agg = pd.DataFrame(index=stats.index)
+        agg["product_title"] = stats["product_title"]
+        agg["price"] = latest
+        agg["volatility"] = std / (num_days ** 0.5)
+        agg["price_change"] = (latest - start).round(2)
+
+        backfilled = self.recent.bfill(axis=1).reindex(stats.index) * rate
+        for column, days in (("daily_pct", 1), ("weekly_pct", 7)):
+            previous = price_on(backfilled, end_date - timedelta(days=days))
+            agg[column] = pct_change(latest, previous)
+        agg["total_pct"] = pct_change(latest, start)
+
+        return rank_by_volatility(agg), start_date, end_date
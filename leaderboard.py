@@ -0,0 +1,35 @@
+"""Server-side paging of the Home leaderboard.
+
+The full aggregate stays in the shared cache; filtering, sorting and slicing
+happen here so only the visible page is styled and sent to the browser.
+"""
+import math
+
+import numpy as np
+
+
+def filter_rows(agg, text):
+    "Rows whose style code or product title contains `text` (case-insensitive)"
+    text = text.strip()
+    if not text:
+        return agg
+    matches = np.zeros(len(agg), dtype=bool)
+    for column in ("style_code", "product_title"):
+        matches |= agg[column].astype(str).str.contains(
+            text, case=False, regex=False).to_numpy()
+    return agg[matches]
+
+
+def page(agg, sort_by="volatility", ascending=False, text="", number=1, size=10):
+    """One page of the filtered, sorted leaderboard.
+
+    Returns the page, the number of matching rows and the number of pages.
+    NaN values sort last in either direction.
+    """
+    rows = filter_rows(agg, text)
+    pages = max(1, math.ceil(len(rows) / size))
+    number = min(max(1, number), pages)
+    start = (number - 1) * size
+    rows = rows.sort_values(
+        by=sort_by, ascending=ascending, na_position="last", kind="mergesort")
+    return rows.iloc[start:start + size].reset_index(drop=True), len(rows), pages
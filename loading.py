@@ -0,0 +1,113 @@
+"""Typed, column-projected reads of the price tables.
+
+Each view reads only the columns it shows (`views`), and rows come back
+compact: style codes, titles, image URLs and dates are categoricals, so each
+distinct value is stored once, and prices are float32. Dates stay
+`datetime.date` categories, ordered by day, so `min`/`max` and the pivot
+columns behave as before. Database rows are read in chunks and compacted
+chunk by chunk, so the object-typed copy of a whole table never exists at
+once.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pandas.io.sql as psql
+import pyarrow as pa
+from pandas.api.types import union_categoricals
+
+views = {
+    # Home never shows images, but rows differing only in `image_url` are
+    # separate listings that each count in the daily mean
+    "home": ["date", "style_code", "product_title", "price", "image_url"],
+    "search": ["date", "product_title", "price", "image_url"],
+}
+categorical = ("date", "style_code", "sku", "product_title", "image_url")
+price_dtype = "float32"
+chunk_size = int(os.environ.get("LOAD_CHUNK_SIZE", 200_000))
+
+
+def _dates(column):
+    "Ordered categorical of `datetime.date`, whatever the driver returned"
+    column = column.astype("category")
+    categories = column.cat.categories
+    days = pd.to_datetime(categories).date if len(categories) else []
+    # a one-to-one mapping only renames categories; otherwise they merge
+    column = column.map(dict(zip(categories, days))).astype("category")
+    return _sorted(column).cat.as_ordered()
+
+
+def _sorted(column):
+    "Categorical `column` with its categories in sorted order"
+    categories = column.cat.categories
+    if categories.is_monotonic_increasing:
+        return column
+    return column.cat.reorder_categories(categories.sort_values())
+
+
+def compact(frame):
+    "Convert `frame` to the compact types in place and return it"
+    for column in frame.columns:
+        if column == "date":
+            frame[column] = _dates(frame[column])
+        elif column in categorical:
+            # sorting a categorical follows its category order
+            frame[column] = _sorted(frame[column].astype("category"))
+        elif column == "price":
+            frame[column] = frame[column].astype(price_dtype)
+    return frame
+
+
+def concat(frames):
+    "Stack compact frames, merging the categories of each categorical column"
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+    columns = {}
+    for column in frames[0].columns:
+        parts = [frame[column] for frame in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            merged = union_categoricals(
+                parts, sort_categories=True, ignore_order=True)
+            columns[column] = merged.as_ordered() if parts[0].cat.ordered \
+                else merged
+        else:
+            columns[column] = np.concatenate([part.to_numpy() for part in parts])
+    return pd.DataFrame(columns)
+
+
+def read_sql(query, conn, params=None):
+    "`read_sql` in chunks of `chunk_size` rows, each compacted on arrival"
+    chunks = psql.read_sql(query, conn, params=params, chunksize=chunk_size)
+    return concat([compact(chunk) for chunk in chunks])
+
+
+def from_arrow(table):
+    """Compact frame of a pyarrow `table`.
+
+    Categorical columns are dictionary-encoded before conversion, so each
+    distinct string becomes a Python object once instead of once per row.
+    """
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if name in categorical:
+            column = column.dictionary_encode()
+        elif name == "price":
+            column = column.cast(pa.float32())
+        columns[name] = column
+    return compact(pa.table(columns).to_pandas())
+
+
+def later_than(column, day):
+    "Mask of the dates in `column` after `day`, for plain or categorical dates"
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return column > day
+    later = np.asarray(column.cat.categories > day, dtype=bool)
+    # code -1 (missing) picks the trailing False
+    later = np.append(later, False)[column.cat.codes.to_numpy()]
+    return pd.Series(later, index=column.index)
+
+
+def memory_mb(frame):
+    "Deep memory size of `frame` in MB, string contents included"
+    return frame.memory_usage(index=True, deep=True).sum() / 2 ** 20
@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+leaderboard_columns = [
+    "product_title",
+    "style_code",
+    "price",
+    "price_change",
+    "daily_pct",
+    "weekly_pct",
+    "total_pct",
+    "volatility",
+]
+
+
+def price_on(prices, date):
+    "Price column for `date`, or NaN for every product when it was not scraped"
+    if date in prices.columns:
+        return prices[date].astype(float)
+    return pd.Series(np.nan, index=prices.index)
+
+
+def pct_change(current, previous):
+    "Percentage change from `previous` to `current`, rounded to 2 decimals"
+    return ((current - previous) / previous * 100).round(2)
+
+
+def daily_pivot(rows):
+    """`style_code` x `date` pivot of each day's mean `price`, NaN where a
+    product was not scraped; repeated rows count once.
+
+    A repeat is a row equal in every column, as `drop_duplicates()` and the
+    SQL engine's `SELECT DISTINCT` see it, so two listings of a product at
+    the same price on one day (e.g. with different images) both count.
+
+    Rows typed by `loading` are pivoted straight from their category codes:
+    repeats are found with `np.unique` on a packed (cell, price) key, refined
+    by the codes of every other column, and the means come from two
+    `bincount`s, a fraction of the memory a grouped mean over the rows takes.
+    """
+    codes, dates = rows["style_code"], rows["date"]
+    if not (isinstance(codes.dtype, pd.CategoricalDtype)
+            and isinstance(dates.dtype, pd.CategoricalDtype)):
+        return rows.drop_duplicates().groupby(
+            ["style_code", "date"])["price"].mean().unstack()
+
+    n_dates = len(dates.cat.categories)
+    size = len(codes.cat.categories) * n_dates
+    prices = rows["price"].to_numpy(dtype=np.float32)
+    cells = codes.cat.codes.to_numpy().astype(np.int64) * n_dates \
+        + dates.cat.codes.to_numpy()
+    valid = (codes.cat.codes.to_numpy() >= 0) & (dates.cat.codes.to_numpy() >= 0) \
+        & ~np.isnan(prices)
+    cells, prices = cells[valid], prices[valid]
+    key = (cells.astype(np.uint64) << np.uint64(32)) \
+        | prices.view(np.uint32).astype(np.uint64)
+    for name in rows.columns.drop(["style_code", "date", "price"]):
+        column = rows[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # missing values (code -1) are one value, as in drop_duplicates
+            values, n_values = column.cat.codes.to_numpy() + 1, \
+                len(column.cat.categories) + 1
+        else:
+            values, uniques = pd.factorize(column, use_na_sentinel=False)
+            n_values = len(uniques)
+        # renumber the keys seen so far densely, then append this column
+        _, key = np.unique(key, return_inverse=True)
+        key = key.astype(np.uint64) * np.uint64(n_values) \
+            + values[valid].astype(np.uint64)
+    _, first = np.unique(key, return_index=True)
+    del key
+    cells, prices = cells[first], prices[first]
+
+    counts = np.bincount(cells, minlength=size).reshape(-1, n_dates)
+    sums = np.bincount(cells, weights=prices, minlength=size).reshape(-1, n_dates)
+    with np.errstate(invalid="ignore"):
+        means = (sums / counts).astype(np.float32)
+    # like groupby(observed=True): no rows for categories nobody has
+    seen_codes, seen_dates = counts.any(axis=1), counts.any(axis=0)
+    return pd.DataFrame(
+        means[np.ix_(seen_codes, seen_dates)],
+        index=pd.Index(codes.cat.categories[seen_codes], name="style_code"),
+        columns=pd.Index(
+            list(dates.cat.categories[seen_dates]), name="date", dtype=object),
+    )
+
+
+def price_metrics(prices, start_date, end_date):
+    """Per-product metrics from a backfilled `style_code` x `date` price pivot.
+
+    Every metric is computed column-wise over the whole pivot. A lookback
+    date with no scraped prices yields NaN for its metric instead of
+    dropping the column.
+    """
+    num_days = (end_date - start_date).days
+    start = price_on(prices, start_date)
+    end = price_on(prices, end_date)
+
+    metrics = pd.DataFrame(index=prices.index)
+    metrics["price"] = end
+    # volatility = std / (365/T)**0.5
+    metrics["volatility"] = prices.std(axis=1) / (num_days ** 0.5)
+    metrics["price_change"] = (end - start).round(2)
+    metrics["daily_pct"] = pct_change(
+        end, price_on(prices, end_date - timedelta(days=1)))
+    metrics["weekly_pct"] = pct_change(
+        end, price_on(prices, end_date - timedelta(days=7)))
+    metrics["total_pct"] = pct_change(end, start)
+    return metrics
+
+
+def rank_by_volatility(agg):
+    """Log-scale the volatility, sort by it and keep the leaderboard columns.
+
+    `agg` is indexed by `style_code` and holds the `price_metrics` columns
+    plus `product_title`.
+    """
+    agg = agg.sort_values(by="volatility", ascending=False).reset_index()
+    agg.columns.name = ""
+    agg["volatility"] = agg.volatility.astype(np.float32)
+    agg["volatility"] = round(np.log1p(agg["volatility"]), 2)
+    agg = agg.sort_values(
+        by="volatility", ascending=False).reset_index(drop=True)
+    return agg[leaderboard_columns]
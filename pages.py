@@ -0,0 +1,55 @@
+"""Pages of the option menu, imported the first time they are shown.
+
+Each page lives in its own module, so opening Home never loads plotly or the
+store lookups and opening Search never builds the leaderboard. A page's
+first import is timed under the `import.<key>` telemetry stage.
+"""
+import importlib
+import sys
+
+import telemetry
+
+
+class Page:
+    "An option menu entry rendered by `module.function`"
+
+    def __init__(self, key, label, icon, module, function, hidden=False):
+        self.key = key
+        self.label = label
+        self.icon = icon
+        self.module = module
+        self.function = function
+        # hidden pages are only listed on request, e.g. behind ?admin=...
+        self.hidden = hidden
+
+    def load(self):
+        "The page's render function, importing its module on first use"
+        if self.module not in sys.modules:
+            with telemetry.span(f"import.{self.key}"):
+                importlib.import_module(self.module)
+        return getattr(sys.modules[self.module], self.function)
+
+    def render(self):
+        with telemetry.span(f"page.{self.key}"):
+            self.load()()
+
+
+registry = {}
+
+
+def register(page):
+    "Add `page` to the option menu, after the pages registered before it"
+    registry[page.key] = page
+    return page
+
+
+register(Page("home", "Home", "house", "dashboard", "home"))
+register(Page("search", "Search", "search", "search", "search"))
+register(Page("portfolio", "Portfolio", "briefcase", "portfolio", "portfolio"))
+register(Page("alerts", "Alerts", "bell", "watchlist", "watchlist"))
+register(Page("admin", "Admin", "speedometer", "admin", "admin", hidden=True))
+
+
+def menu(show_hidden=False):
+    "Pages to list in the option menu, in registration order"
+    return [page for page in registry.values() if show_hidden or not page.hidden]
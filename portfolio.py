@@ -0,0 +1,62 @@
+"""The Portfolio page: uploaded holdings valued at current prices."""
+import pandas as pd
+import streamlit as st
+import holdings
+import telemetry
+from stores import display_currency, registry
+from utils import style_signs
+
+
+def portfolio():
+    st.write(f"Upload a CSV with one row per pair you own: `style_code`, `size` and `purchase_price` (in {display_currency}), plus an optional `quantity`. Every model number in the file is priced at once and each pair is valued at the store's latest price.")
+    labels = {store.label: key for key, store in registry.items()}
+    store = st.selectbox("Value at", list(labels), key="portfolio_store")
+    upload = st.file_uploader("Holdings", type="csv", key="portfolio_file")
+    if upload is None:
+        return
+
+    # large files are priced chunk by chunk while the progress bar advances
+    progress = st.progress(0.0)
+    frames = []
+    try:
+        with telemetry.span("portfolio.value"):
+            for chunk in holdings.stream(upload, labels[store]):
+                frames.append(chunk)
+                progress.progress(min(1.0, upload.tell() / max(upload.size, 1)))
+    except (ValueError, pd.errors.ParserError) as error:
+        st.error(f"Could not read {upload.name}: {error}")
+        return
+    progress.empty()
+    if not frames:
+        st.markdown("### The file has no holdings")
+        return
+
+    valued = pd.concat(frames, ignore_index=True)
+    totals = holdings.summary(valued)
+    cost, value, pnl = st.columns(3)
+    cost.metric(f"Cost ({display_currency})", f"{totals['cost']:,.2f}")
+    value.metric(f"Value ({display_currency})", f"{totals['value']:,.2f}")
+    pnl.metric("Unrealized P&L", f"{totals['pnl']:,.2f}",
+               f"{totals['pnl_pct']:.2f}%")
+    st.caption(f"{totals['priced']} of {totals['holdings']} holdings priced at {store}")
+
+    st.subheader("Holdings")
+    table = valued.rename(
+        columns={
+            "style_code": "model number",
+            "purchase_price": "purchase price",
+            "price": "current price",
+            "volatility": f"volatility ({holdings.volatility_window}d, annualized %)",
+            "as_of": "priced on",
+            "pnl": "P&L",
+            "pnl_pct": "P&L %",
+        }
+    )
+    st.dataframe(
+        table.style.hide()
+        .apply(style_signs, axis=None)
+    )
+
+    missing = valued.loc[valued["price"].isna(), "style_code"].unique()
+    if len(missing):
+        st.markdown(f"Not found in {store}: {', '.join(missing)}")
@@ -0,0 +1,171 @@
+"""Precompute the Home page results outside of user requests.
+
+Run `python precompute.py` after the scraper finishes (or `--every SECONDS`
+to keep it running on a schedule). Each run computes the leaderboard, the
+top gainers and losers, the volatility ranking and the rolling-window
+metrics of every lookback, and publishes them as a new version directory
+under `artifact_dir`; the `LATEST` pointer is swapped atomically once the
+version is complete. Pages only read the latest version. Each run then
+scans the new rows for price alerts (see `alerts`).
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+import telemetry
+
+artifact_dir = os.environ.get("ARTIFACT_DIR", os.path.join(".cache", "artifacts"))
+enabled = os.environ.get("HOME_PRECOMPUTED", "1") == "1"
+keep_versions = int(os.environ.get("ARTIFACT_KEEP", 5))
+top_n = 5
+
+_latest = None
+_latest_lock = threading.Lock()
+
+
+def top_movers(agg, n=top_n):
+    "Biggest price gains and drops, largest move first"
+    gainers = agg.sort_values(by="price_change", ascending=False).reset_index(
+        drop=True
+    )
+    losers = agg.sort_values(by="price_change", ascending=True).reset_index(
+        drop=True
+    )
+    return gainers.head(n), losers.head(n)
+
+
+def compute(rate):
+    "Home results from the configured engine, as a dict ready to publish"
+    import analytics
+    from data import build_price_matrix, compute_leaderboard
+
+    agg, start_date, end_date = compute_leaderboard(rate)
+    gainers, losers = top_movers(agg)
+    matrix = build_price_matrix()
+    return {
+        "leaderboard": agg,
+        "start_date": start_date,
+        "end_date": end_date,
+        "rate": rate,
+        "gainers": list(gainers["style_code"]),
+        "losers": list(losers["style_code"]),
+        "most_volatile": list(agg["style_code"].head(top_n)),
+        "windows": {
+            window: analytics.window_metrics(matrix, window, rate)
+            for window in analytics.windows
+        },
+    }
+
+
+def publish(results, directory=None):
+    "Write `results` as a new version and point `LATEST` at it"
+    directory = directory or artifact_dir
+    version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    staging = os.path.join(directory, f".{version}.tmp")
+    os.makedirs(staging)
+    results["leaderboard"].to_parquet(
+        os.path.join(staging, "leaderboard.parquet"), index=False)
+    windows = results.get("windows", {})
+    for window, frame in windows.items():
+        frame.to_parquet(
+            os.path.join(staging, f"window_{window}.parquet"), index=False)
+    meta = {
+        key: value.isoformat() if isinstance(value, date) else value
+        for key, value in results.items()
+        if key not in ("leaderboard", "windows")
+    }
+    meta["windows"] = sorted(windows)
+    meta["version"] = version
+    with open(os.path.join(staging, "meta.json"), "w") as fp:
+        json.dump(meta, fp)
+    os.rename(staging, os.path.join(directory, version))
+
+    pointer = os.path.join(directory, "LATEST")
+    with open(f"{pointer}.tmp", "w") as fp:
+        fp.write(version)
+    os.replace(f"{pointer}.tmp", pointer)
+    _prune(directory)
+    return version
+
+
+def _prune(directory):
+    versions = sorted(
+        name for name in os.listdir(directory)
+        if not name.startswith(".") and name != "LATEST"
+        and os.path.isdir(os.path.join(directory, name))
+    )
+    for name in versions[:-keep_versions]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def latest(directory=None):
+    """The most recently published results, or None before the first run.
+
+    The loaded version is kept in memory until a newer one is published.
+    """
+    global _latest
+    directory = directory or artifact_dir
+    try:
+        with open(os.path.join(directory, "LATEST")) as fp:
+            version = fp.read().strip()
+    except OSError:
+        return None
+
+    with _latest_lock:
+        if _latest is not None and _latest["version"] == version:
+            telemetry.count("cache", cache="artifact", result="hit")
+            return _latest
+        telemetry.count("cache", cache="artifact", result="miss")
+        path = os.path.join(directory, version)
+        with open(os.path.join(path, "meta.json")) as fp:
+            results = json.load(fp)
+        results["leaderboard"] = pd.read_parquet(
+            os.path.join(path, "leaderboard.parquet"))
+        # versions published before rolling windows have none
+        results["windows"] = {
+            window: pd.read_parquet(os.path.join(path, f"window_{window}.parquet"))
+            for window in results.get("windows", [])
+        }
+        for key in ("start_date", "end_date"):
+            results[key] = date.fromisoformat(results[key])
+        _latest = results
+        return results
+
+
+def ranked(results, key):
+    "Leaderboard rows of the style codes listed under `key`, in that order"
+    agg = results["leaderboard"].set_index("style_code", drop=False)
+    return agg.loc[results[key]].reset_index(drop=True)
+
+
+def run(every=None):
+    "Compute and publish once, or every `every` seconds"
+    import alerts
+    import fx
+
+    while True:
+        start = time.perf_counter()
+        version = publish(compute(fx.rate("GBP", "USD")))
+        print(f"Published {version} in {time.perf_counter() - start:.1f}s")
+        if alerts.enabled:
+            # new rows have arrived; scan them while they are the newest
+            start = time.perf_counter()
+            raised = alerts.scan()
+            print(f"Raised {len(raised)} alerts in {time.perf_counter() - start:.1f}s")
+        if every is None:
+            return
+        time.sleep(every)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the Home page")
+    parser.add_argument("--every", type=float, default=None,
+                        help="keep running, publishing every EVERY seconds")
+    args = parser.parse_args()
+    run(args.every)
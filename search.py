@@ -0,0 +1,161 @@
+"""The Search page: one store's price history or all stores side by side."""
+import pandas as pd
+import streamlit as st
+import telemetry
+from charts import cached_price_chart
+from stores import display_currency, lookup, lookup_many, prepare, registry
+from suggest import shared_index
+from utils import style_signs
+
+
+def search():
+    st.write("All original NIke sneakers have tags attached to them with their sizes, barcodes, and model numbers. The model number of the sneaker is usually located under the size and above the barcode. Most times, it is a 6-digit number / alphabet followed by a 3-digit number / alphabet (e.g. DJ0950-113).  You can also find it in the description on retail sites or on the box.")
+    find = st.text_input(
+        label="Find a model number or sneaker name",
+        key="suggest_query",
+        placeholder="Start typing, e.g. DJ09 or panda ...",
+    )
+    if find:
+        with telemetry.span("search.suggest"):
+            suggestions = shared_index.suggest(find)
+        if suggestions:
+            pick = st.selectbox(
+                "Suggestions",
+                suggestions,
+                format_func=lambda code: f"{code}  {shared_index.title(code) or ''}",
+            )
+            if st.button("Use this model number"):
+                st.session_state["unique_code"] = pick
+        else:
+            st.markdown("No matching model numbers")
+
+    compare = "Compare all stores"
+    labels = {store.label: key for key, store in registry.items()}
+
+    with st.form("sneaker_form", clear_on_submit=True):
+
+        user_input = st.text_input(
+            label="Model Number",
+            max_chars=30,
+            key="unique_code",
+            placeholder="Enter your model number here ...",
+        )
+        stores = st.selectbox(
+            "Choose a retail store", list(labels) + [compare])
+        full_resolution = st.checkbox(
+            "Chart every data point",
+            help="Long histories are thinned out to keep the chart fast.")
+        submitted = st.form_submit_button("Submit")
+        style_code = st.session_state["unique_code"].upper()
+
+        if submitted & (len(style_code) > 0):
+            st.success("valid input")
+
+            # data validation
+            if (
+                isinstance(user_input, str)
+                & ("-" in style_code)
+                & (10 >= len(style_code) < 30)
+            ):
+                if stores == compare:
+                    with telemetry.span("search.compare"):
+                        compare_stores(style_code, full_resolution)
+                else:
+                    st.subheader(stores)
+                    # read in data from database
+                    df = lookup(labels[stores], style_code)
+
+                    if (df.shape[0]) > 0:
+                        with telemetry.span("search.prepare"):
+                            df = prepare(labels[stores], df)
+                        with telemetry.span("search.render"):
+                            show_store(
+                                df,
+                                (style_code, labels[stores]),
+                                full_resolution,
+                            )
+                    else:
+                        st.markdown(f"### {style_code} not found in database")
+
+
+def show_store(df, chart_key, full_resolution=False):
+    "Image, summary statistics and price chart of one store's price history"
+    title = df["product_title"].unique()[0]
+    img = df["image_url"].unique()[0]
+    data = df.sort_values(
+        by="date", ascending=False).copy()
+    # st.markdown(f"![{style_code} {title}]({img})")
+    st.image(img)
+    frame = data.describe().T
+    frame["initial"] = list(data["price"])[0]
+    frame["current"] = list(data["price"])[-1]
+    frame["change"] = list(
+        data["price"])[-1] - list(data["price"])[0]
+    frame.rename(
+        columns={
+            "mean": "average",
+            "std": "standard deviation",
+            "max": "maximum",
+            "min": "minimum",
+        },
+        inplace=True,
+    )
+    st.subheader("Summary Statistics")
+    st.dataframe(
+        frame.style.hide()
+        .apply(style_signs, axis=None)
+    )
+    fig = cached_price_chart(
+        chart_key,
+        data[["date", "price"]],
+        f"{title} Price Change Over Time",
+        full_resolution=full_resolution,
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def compare_stores(style_code, full_resolution=False):
+    "Overlaid price histories and per-store statistics from every store"
+    st.subheader("All Stores")
+    frames = lookup_many(list(registry), style_code)
+    frames = [
+        prepare(key, df).assign(store=registry[key].label)
+        for key, df in frames.items()
+        if df.shape[0] > 0
+    ]
+    if not frames:
+        st.markdown(f"### {style_code} not found in database")
+        return
+
+    data = pd.concat(frames, ignore_index=True).sort_values(by="date")
+    title = data["product_title"].iloc[-1]
+    st.image(data["image_url"].iloc[-1])
+
+    prices = data.groupby("store")["price"]
+    summary = prices.agg(["first", "last", "mean", "std", "min", "max"])
+    summary["change"] = summary["last"] - summary["first"]
+    summary.rename(
+        columns={
+            "first": "initial",
+            "last": "current",
+            "mean": "average",
+            "std": "standard deviation",
+            "min": "minimum",
+            "max": "maximum",
+        },
+        inplace=True,
+    )
+    st.subheader("Summary Statistics")
+    st.dataframe(
+        summary.style
+        .apply(style_signs, axis=None)
+    )
+
+    fig = cached_price_chart(
+        (style_code, "all stores"),
+        data[["date", "price", "store"]],
+        f"{title} Price Change Over Time ({display_currency})",
+        color="store",
+        full_resolution=full_resolution,
+    )
+    st.plotly_chart(fig, use_container_width=True)
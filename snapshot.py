@@ -0,0 +1,153 @@
+"""Columnar on-disk copy of a price table for fast cold starts.
+
+Rows are kept as Parquet files partitioned by day (`date=YYYY-MM-DD/`) and
+sorted by style code, so a fresh process memory-maps the history instead of
+pulling it over the network, and single style code reads only touch the
+columns and row groups they need. `sync` brings the copy up to date by
+re-reading the last stored day and everything after it.
+"""
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+import pandas.io.sql as psql
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import loading
+from database import connection
+
+snapshot_dir = os.environ.get("SNAPSHOT_DIR", os.path.join(".cache", "snapshot"))
+enabled = os.environ.get("SNAPSHOT_ENABLED", "1") == "1"
+# minimum seconds between two watermark syncs with the database
+sync_interval = float(os.environ.get("SNAPSHOT_SYNC_INTERVAL", 60))
+
+_partitioning = ds.partitioning(pa.schema([("date", pa.date32())]), flavor="hive")
+
+
+class Snapshot:
+    "Day-partitioned Parquet copy of `table`, selected with `query`"
+
+    def __init__(self, table, query, columns, key="style_code", path=None,
+                 row_group_size=4096):
+        self.table = table
+        self.query = query
+        self.columns = columns
+        self.key = key
+        self.path = path or os.path.join(snapshot_dir, table)
+        self.row_group_size = row_group_size
+        # fixed column types, so a day where a column is all NULL is still
+        # stored (and read back) as strings or floats rather than `null`
+        self.schema = pa.schema(
+            [(column, pa.float64() if column == "price" else pa.string())
+             for column in columns if column != "date"])
+        self.synced = None
+        self._lock = threading.Lock()
+
+    def _partition(self, day):
+        return os.path.join(self.path, f"date={day.isoformat()}")
+
+    def days(self):
+        "Stored days, oldest first"
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(
+            pd.Timestamp(name.split("=", 1)[1]).date()
+            for name in os.listdir(self.path) if name.startswith("date=")
+        )
+
+    def watermark(self):
+        "Latest stored day, or None for an empty snapshot"
+        days = self.days()
+        return days[-1] if days else None
+
+    def write(self, rows):
+        "Store `rows`, replacing the partitions of every day they cover"
+        rows = rows.copy()
+        rows["date"] = pd.to_datetime(rows["date"]).dt.date
+        # the database lookups match on UPPER(style_code); store that form
+        rows[self.key] = rows[self.key].str.upper()
+        for day, day_rows in rows.groupby("date"):
+            day_rows = day_rows.drop(columns="date").sort_values(self.key)
+            table = pa.Table.from_pandas(
+                day_rows[self.schema.names], schema=self.schema,
+                preserve_index=False)
+            directory = self._partition(day)
+            os.makedirs(directory, exist_ok=True)
+            target = os.path.join(directory, "part-0.parquet")
+            # dataset discovery skips dot files, so readers never see a
+            # partial file; the name is unique per writer and process
+            tmp = os.path.join(directory, f".part-0.{uuid.uuid4().hex}.tmp")
+            try:
+                pq.write_table(table, tmp, row_group_size=self.row_group_size)
+                os.replace(tmp, target)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+    def sync(self, force=False):
+        """Fetch the rows of the last stored day onwards and store them.
+
+        The last day is re-read in case the scraper was still writing it.
+        Returns the fetched rows.
+        """
+        with self._lock:
+            if not force and self.synced is not None and \
+                    time.monotonic() - self.synced < sync_interval:
+                return None
+            watermark = self.watermark()
+            query, params = self.query, None
+            if watermark is not None:
+                query += ' WHERE "date" >= %(watermark)s'
+                params = {"watermark": watermark}
+            with connection() as conn:
+                rows = psql.read_sql(query, conn, params=params)
+            self.write(rows)
+            self.synced = time.monotonic()
+            return rows
+
+    def read(self, columns=None, filters=None, typed=False):
+        """Memory-mapped read of the stored rows.
+
+        `columns` projects the read and `filters` (pyarrow filter tuples, e.g.
+        `[("style_code", "=", code)]`) is pushed down to partitions and row
+        groups. Dates come back as `datetime.date`; with `typed` the frame
+        has the compact `loading` types.
+        """
+        columns = columns or self.columns
+        if not self.days():
+            empty = pd.DataFrame(columns=columns)
+            return loading.compact(empty) if typed else empty
+        table = pq.read_table(
+            self.path,
+            columns=columns,
+            filters=filters,
+            schema=self.schema.insert(0, pa.field("date", pa.date32())),
+            memory_map=True,
+            partitioning=_partitioning,
+        )
+        if typed:
+            return loading.from_arrow(table)[columns]
+        return table.to_pandas()[columns]
+
+    def lookup(self, code, columns=None):
+        "Rows of a single style code"
+        return self.read(columns, filters=[(self.key, "=", code)])
+
+
+sole_supplier = Snapshot(
+    "sole_supplier",
+    """
+        SELECT
+            "date",
+            style_code,
+            product_title,
+            ROUND(price,2) AS price,
+            image_url
+        FROM sole_supplier
+    """,
+    columns=["date", "style_code", "product_title", "price", "image_url"],
+)
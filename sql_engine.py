@@ -0,0 +1,148 @@
+"""Home leaderboard aggregated inside the database.
+
+The query returns one row per style code, so transfer size and app memory no
+longer grow with the price history. It mirrors the pandas path: a product
+missing on a day takes its next observed daily price (the backfilled pivot),
+so every daily price is weighted by the number of pivot dates it covers.
+"""
+import sys
+
+import pandas as pd
+import pandas.io.sql as psql
+
+from metrics import pct_change, rank_by_volatility
+
+view_name = "sole_supplier_leaderboard"
+
+# date arithmetic is the only dialect-specific part of the query
+_days_before = {
+    "postgres": "{column} - {days}",
+    "sqlite": "DATE({column}, '-{days} day')",
+}
+
+_query = """
+WITH deduplicated AS (
+    SELECT DISTINCT "date", style_code, product_title,
+        ROUND(price, 2) AS price, image_url
+    FROM sole_supplier
+),
+daily AS (
+    SELECT style_code, "date", AVG(price) AS price,
+        MAX(product_title) AS product_title
+    FROM deduplicated
+    GROUP BY style_code, "date"
+),
+dates AS (
+    SELECT "date", ROW_NUMBER() OVER (ORDER BY "date") - 1 AS idx
+    FROM (SELECT DISTINCT "date" FROM daily) AS distinct_dates
+),
+bounds AS (
+    SELECT MIN("date") AS start_date, MAX("date") AS end_date,
+        {one_day_before} AS one_day_before,
+        {seven_days_before} AS seven_days_before
+    FROM dates
+),
+weighted AS (
+    SELECT daily.*, dates.idx,
+        LAG(daily."date") OVER products AS previous_date,
+        dates.idx - COALESCE(LAG(dates.idx) OVER products, -1) AS weight
+    FROM daily JOIN dates ON dates."date" = daily."date"
+    WINDOW products AS (PARTITION BY daily.style_code ORDER BY daily."date")
+),
+centred AS (
+    SELECT weighted.*,
+        SUM(weight * price) OVER (PARTITION BY style_code)
+            / SUM(weight) OVER (PARTITION BY style_code) AS mean_price
+    FROM weighted
+)
+SELECT
+    style_code,
+    MAX(product_title) AS product_title,
+    MAX(CASE WHEN previous_date IS NULL THEN price END) AS start_price,
+    MAX(CASE WHEN "date" = end_date THEN price END) AS price,
+    CASE WHEN one_day_before IN (SELECT "date" FROM dates)
+        THEN MAX(CASE WHEN "date" >= one_day_before
+            AND (previous_date IS NULL OR previous_date < one_day_before)
+            THEN price END)
+    END AS one_day_price,
+    CASE WHEN seven_days_before IN (SELECT "date" FROM dates)
+        THEN MAX(CASE WHEN "date" >= seven_days_before
+            AND (previous_date IS NULL OR previous_date < seven_days_before)
+            THEN price END)
+    END AS seven_day_price,
+    SQRT(SUM(weight * (price - mean_price) * (price - mean_price))
+        / NULLIF(SUM(weight) - 1, 0)) AS price_std,
+    start_date,
+    end_date
+FROM centred CROSS JOIN bounds
+GROUP BY style_code, start_date, end_date, one_day_before, seven_days_before
+"""
+
+
+def leaderboard_query(dialect="postgres"):
+    "Single-pass leaderboard query for `postgres` or the `sqlite` stand-in"
+    days_before = _days_before[dialect]
+    return _query.format(
+        one_day_before=days_before.format(column='MAX("date")', days=1),
+        seven_days_before=days_before.format(column='MAX("date")', days=7),
+    )
+
+
+def materialized_view_ddl():
+    "DDL for a Postgres materialized view holding the leaderboard rows"
+    return f"CREATE MATERIALIZED VIEW IF NOT EXISTS {view_name} AS {leaderboard_query()}"
+
+
+def refresh_materialized_view(connection):
+    "Recompute the materialized view, e.g. after the scraper has run"
+    with connection.cursor() as cursor:
+        cursor.execute(f"REFRESH MATERIALIZED VIEW {view_name}")
+    connection.commit()
+
+
+def finish_leaderboard(rows, rate):
+    """Convert the per-product rows into the Home leaderboard.
+
+    Returns the same frame and dates as `data.aggregate_sole_supplier`.
+    """
+    start_date = pd.to_datetime(rows["start_date"].iloc[0]).date()
+    end_date = pd.to_datetime(rows["end_date"].iloc[0]).date()
+    num_days = (end_date - start_date).days
+
+    rows = rows.set_index("style_code")
+    start = rows["start_price"].astype(float) * rate
+    latest = rows["price"].astype(float) * rate
+
+    agg = pd.DataFrame(index=rows.index)
+    agg["product_title"] = rows["product_title"]
+    agg["price"] = latest
+    agg["volatility"] = rows["price_std"].astype(float) * rate / (num_days ** 0.5)
+    agg["price_change"] = (latest - start).round(2)
+    agg["daily_pct"] = pct_change(
+        latest, rows["one_day_price"].astype(float) * rate)
+    agg["weekly_pct"] = pct_change(
+        latest, rows["seven_day_price"].astype(float) * rate)
+    agg["total_pct"] = pct_change(latest, start)
+    return rank_by_volatility(agg), start_date, end_date
+
+
+def read_leaderboard(connection, rate, dialect="postgres", from_view=False):
+    "Run the leaderboard query (or read its materialized view) and finish it"
+    query = f"SELECT * FROM {view_name}" if from_view else leaderboard_query(dialect)
+    rows = psql.read_sql(query, connection)
+    return finish_leaderboard(rows, rate)
+
+
+if __name__ == "__main__":
+    # python sql_engine.py create-view | refresh-view
+    from database import connection
+
+    with connection() as conn:
+        if sys.argv[1:] == ["create-view"]:
+            with conn.cursor() as cursor:
+                cursor.execute(materialized_view_ddl())
+            conn.commit()
+        elif sys.argv[1:] == ["refresh-view"]:
+            refresh_materialized_view(conn)
+        else:
+            sys.exit("usage: python sql_engine.py create-view | refresh-view")
@@ -0,0 +1,211 @@
+"""Style code lookups against the store tables.
+
+Every store the Search page can query is described once in the `registry`.
+Queries use bound parameters and match on a normalized key that the indexes
+from `index_ddl` can serve, and recent lookups are kept in an in-process LRU
+keyed on the table version.
+"""
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pandas.io.sql as psql
+from cachetools import TTLCache
+
+import fx
+import snapshot
+import telemetry
+from data import table_version
+from database import connection
+
+lookup_cache_size = int(os.environ.get("SEARCH_CACHE_SIZE", 256))
+lookup_cache_ttl = float(os.environ.get("SEARCH_CACHE_TTL", 60 * 60))
+# prices from every store are shown in this currency
+display_currency = "USD"
+
+
+class Store:
+    """A scraped price table.
+
+    `code` is the SQL expression giving the normalized style code of a row
+    and `price` the expression giving its price in `currency`.
+    """
+
+    def __init__(self, key, label, table, code, price, currency, index_name,
+                 snapshot=None):
+        self.key = key
+        self.label = label
+        self.table = table
+        self.code = code
+        self.price = price
+        self.currency = currency
+        self.index_name = index_name
+        # local `snapshot.Snapshot` of the table, read instead of the database
+        self.snapshot = snapshot
+
+    @property
+    def lookup_query(self):
+        "Price history of one style code, bound as `%(style_code)s`"
+        return f"""
+            SELECT
+                "date",
+                product_title,
+                {self.price} AS price,
+                image_url
+            FROM {self.table}
+            WHERE {self.code} = %(style_code)s
+        """
+
+    @property
+    def batch_query(self):
+        "Price histories of many style codes, bound as a `%(style_codes)s` list"
+        return f"""
+            SELECT
+                {self.code} AS style_code,
+                "date",
+                {self.price} AS price
+            FROM {self.table}
+            WHERE {self.code} = ANY(%(style_codes)s)
+        """
+
+    @property
+    def since_query(self):
+        "Rows scraped on or after a day, bound as `%(watermark)s`; see `date_index_ddl`"
+        return f"""
+            SELECT
+                {self.code} AS style_code,
+                "date",
+                {self.price} AS price
+            FROM {self.table}
+            WHERE "date" >= %(watermark)s
+        """
+
+    @property
+    def index_ddl(self):
+        "b-tree index on the same expression the lookup filters on"
+        return (f"CREATE INDEX IF NOT EXISTS {self.index_name} "
+                f'ON {self.table} (({self.code}), "date")')
+
+    @property
+    def date_index_ddl(self):
+        """b-tree index on `"date"` alone, for the reads of new days and the
+        latest-day probe"""
+        return (f"CREATE INDEX IF NOT EXISTS {self.table}_date_idx "
+                f'ON {self.table} ("date")')
+
+
+registry = {}
+
+
+def register(store):
+    "Make `store` available to lookups, comparisons and suggestions"
+    registry[store.key] = store
+    return store
+
+
+register(Store(
+    key="sole_supplier",
+    label="sole_supplier Supplier",
+    table="sole_supplier",
+    code="UPPER(style_code)",
+    price="price",
+    currency="GBP",
+    index_name="sole_supplier_style_code_idx",
+    snapshot=snapshot.sole_supplier if snapshot.enabled else None,
+))
+register(Store(
+    key="goat",
+    label="Goat",
+    table="goat",
+    code="UPPER(REPLACE(sku, ' ', '-'))",
+    price="(retail_price_cents/100)",
+    currency="USD",
+    index_name="goat_sku_idx",
+))
+
+_lookups = TTLCache(maxsize=lookup_cache_size, ttl=lookup_cache_ttl)
+_lookups_lock = threading.Lock()
+
+
+def normalize_style_code(style_code):
+    "Canonical model number: upper case with a dash between the two parts"
+    return style_code.strip().upper().replace(" ", "-")
+
+
+def lookup(store, style_code):
+    """Price history of `style_code` in `store` (a copy, safe to modify).
+
+    Cached per table version, so new scraper rows are looked up afresh.
+    """
+    key = (store, normalize_style_code(style_code),
+           table_version(registry[store].table))
+    with _lookups_lock:
+        frame = _lookups.get(key)
+    telemetry.count(
+        "cache", cache="lookup", result="miss" if frame is None else "hit")
+    if frame is None:
+        local = registry[store].snapshot
+        with telemetry.span(f"search.lookup.{store}"):
+            if local is not None:
+                local.sync()
+                frame = local.lookup(
+                    key[1], ["date", "product_title", "price", "image_url"])
+            else:
+                with connection() as conn:
+                    frame = psql.read_sql(
+                        registry[store].lookup_query, conn,
+                        params={"style_code": key[1]})
+        telemetry.frame(f"search.lookup.{store}", frame)
+        with _lookups_lock:
+            _lookups[key] = frame
+    return frame.copy()
+
+
+def lookup_many(stores, style_code):
+    """Look `style_code` up in several stores at once.
+
+    Each store is queried on its own thread and pooled connection, so the
+    wait is that of the slowest store rather than the sum of all of them.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, len(stores))) as executor:
+        futures = {store: executor.submit(lookup, store, style_code)
+                   for store in stores}
+        return {store: future.result() for store, future in futures.items()}
+
+
+def prepare(store, frame):
+    "Parse dates and convert prices to the display currency"
+    frame["date"] = pd.to_datetime(frame["date"]).dt.date
+    price = frame["price"].round(2)
+    currency = registry[store].currency
+    if currency != display_currency:
+        if fx.historical:
+            price = fx.convert(price, frame["date"], currency, display_currency)
+        else:
+            price = price * fx.rate(currency, display_currency)
+    frame["price"] = price
+    return frame
+
+
+def index_ddl():
+    "Lookup and date index DDL for every registered store"
+    return [ddl for store in registry.values()
+            for ddl in (store.index_ddl, store.date_index_ddl)]
+
+
+def create_indexes(conn):
+    "Create the lookup and date indexes (idempotent)"
+    with conn.cursor() as cursor:
+        for ddl in index_ddl():
+            cursor.execute(ddl)
+    conn.commit()
+
+
+if __name__ == "__main__":
+    # python stores.py create-indexes
+    if sys.argv[1:] != ["create-indexes"]:
+        sys.exit("usage: python stores.py create-indexes")
+    with connection() as conn:
+        create_indexes(conn)
@@ -0,0 +1,166 @@
+"""In-memory autocomplete over every known style code and product title.
+
+Prefix matches come from a sorted array of style codes searched with bisect;
+misspelt codes and title words fall back to trigram matching. The index is
+built once per process, shared by every session and topped up with the codes
+scraped since the last refresh, so suggestions need no database round-trip.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+import pandas.io.sql as psql
+
+import telemetry
+from database import connection
+from stores import normalize_style_code, registry
+
+refresh_interval = float(os.environ.get("SUGGEST_REFRESH", 15 * 60))
+
+
+def _codes_query(store, where):
+    return f"""
+        SELECT
+            {store.code} AS style_code,
+            MAX(product_title) AS product_title,
+            MAX("date") AS last_date
+        FROM {store.table}
+        {where}
+        GROUP BY {store.code}
+    """
+
+
+def trigrams(text):
+    "Set of padded, lower-cased character trigrams of `text`"
+    text = f"  {text.lower()} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SuggestionIndex:
+    "Sorted style codes for prefix search plus a trigram index for fuzzy search"
+
+    def __init__(self):
+        self.codes = []
+        self.titles = {}
+        self.postings = defaultdict(list)
+
+    def _index(self, code, title):
+        self.titles[code] = title
+        for gram in trigrams(code) | trigrams(title or ""):
+            self.postings[gram].append(code)
+
+    def build(self, entries):
+        "Index `(style_code, product_title)` pairs from scratch"
+        self.codes, self.titles, self.postings = [], {}, defaultdict(list)
+        for code, title in entries:
+            code = normalize_style_code(code)
+            if code not in self.titles:
+                self._index(code, title)
+        self.codes = sorted(self.titles)
+        return self
+
+    def add(self, entries):
+        "Index unseen codes; cheap for the handful a daily refresh brings"
+        for code, title in entries:
+            code = normalize_style_code(code)
+            if code in self.titles:
+                continue
+            insort(self.codes, code)
+            self._index(code, title)
+
+    def prefix(self, text, limit=10):
+        "Style codes starting with `text`, in order"
+        text = normalize_style_code(text)
+        matches = []
+        position = bisect_left(self.codes, text)
+        while position < len(self.codes) and len(matches) < limit:
+            code = self.codes[position]
+            if not code.startswith(text):
+                break
+            matches.append(code)
+            position += 1
+        return matches
+
+    def fuzzy(self, text, limit=10):
+        """Style codes whose code or title shares the most trigrams with `text`.
+
+        Trigrams found in over a tenth of the index (" ni", "dun") say little
+        and are skipped, and a match needs a third of the remaining ones.
+        """
+        common = max(100, len(self.codes) // 10)
+        postings = [self.postings[gram] for gram in trigrams(text)
+                    if gram in self.postings]
+        rare = [codes for codes in postings if len(codes) <= common]
+        postings = rare or postings
+        scores = Counter()
+        for codes in postings:
+            scores.update(codes)
+        needed = max(1, len(postings) // 3)
+        return [code for code, score in scores.most_common(limit)
+                if score >= needed]
+
+    def suggest(self, text, limit=10):
+        "Prefix matches first, topped up with fuzzy matches"
+        if not text.strip():
+            return []
+        matches = self.prefix(text, limit)
+        if len(matches) < limit:
+            for code in self.fuzzy(text, limit):
+                if len(matches) == limit:
+                    break
+                if code not in matches:
+                    matches.append(code)
+        return matches
+
+
+class SharedIndex:
+    "Process-wide `SuggestionIndex` kept in sync with the store tables"
+
+    def __init__(self):
+        self.index = SuggestionIndex()
+        self.watermarks = {}
+        self.refreshed = None
+        self._lock = threading.Lock()
+
+    def _fetch(self, store):
+        where, params = "", None
+        if store.key in self.watermarks:
+            # the last day is read again: the scraper may still have been
+            # writing it, and `add` skips the codes already indexed
+            where = 'WHERE "date" >= %(since)s'
+            params = {"since": self.watermarks[store.key]}
+        with connection() as conn:
+            return psql.read_sql(_codes_query(store, where), conn, params=params)
+
+    def refresh(self):
+        "Fetch codes scraped since the last refresh and index them"
+        with self._lock, telemetry.span("suggest.refresh"):
+            first = self.refreshed is None
+            entries = []
+            for store in registry.values():
+                frame = self._fetch(store)
+                entries += zip(frame["style_code"], frame["product_title"])
+                if len(frame):
+                    self.watermarks[store.key] = frame["last_date"].max()
+            if first:
+                # build aside and swap so readers never see a half-built index
+                self.index = SuggestionIndex().build(entries)
+            else:
+                self.index.add(entries)
+            self.refreshed = time.monotonic()
+
+    def suggest(self, text, limit=10):
+        "Suggestions for `text`, refreshing the index when it is due"
+        if self.refreshed is None or \
+                time.monotonic() - self.refreshed > refresh_interval:
+            self.refresh()
+        return self.index.suggest(text, limit)
+
+    def title(self, code):
+        "Product title indexed for `code`"
+        return self.index.titles.get(code)
+
+
+shared_index = SharedIndex()
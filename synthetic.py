@@ -0,0 +1,94 @@
+"""Seeded synthetic price tables shaped like the scraped ones.
+
+`sole_supplier` and `goat` return frames with the columns of the real tables,
+at any number of style codes and days of history, and `database` loads them
+into SQLite as a local stand-in for Postgres. The same arguments always give
+the same rows, so benchmark runs are comparable between versions.
+"""
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+start_date = date(2022, 1, 1)
+models = ["Dunk Low", "Dunk High", "Dunk Low SB", "Air Force 1", "Air Max 90",
+          "Air Jordan 1 Mid", "Air Jordan 4"]
+colours = ["Panda", "Black White", "University Red", "Grey Fog", "Syracuse",
+           "Coast", "Pine Green"]
+
+
+def style_codes(n_products):
+    "Distinct Nike-like style codes: two letters, four digits, dash, three digits"
+    return [
+        f"{chr(65 + i % 26)}{chr(65 + i // 26 % 26)}{i // 676 % 10_000:04d}"
+        f"-{i % 997:03d}"
+        for i in range(n_products)
+    ]
+
+
+def product_titles(codes):
+    "Product title of each style code"
+    return [f"Nike {models[i % len(models)]} {colours[i // 7 % len(colours)]}"
+            for i in range(len(codes))]
+
+
+def price_pivot(n_products, n_days=365, seed=0):
+    "Backfilled `style_code` x `date` random-walk price pivot"
+    rng = np.random.default_rng(seed)
+    dates = [start_date + timedelta(days=i) for i in range(n_days)]
+    steps = rng.normal(0, 2, size=(n_products, n_days))
+    prices = np.round(120 + np.abs(np.cumsum(steps, axis=1)), 2)
+    prices[rng.random(prices.shape) < 0.05] = np.nan
+    return pd.DataFrame(
+        prices, index=style_codes(n_products), columns=dates).bfill(axis=1)
+
+
+def _rows(pivot, seed, missing, duplicates):
+    "Long rows of `pivot` with missing days and duplicated scrapes"
+    rng = np.random.default_rng(seed)
+    rows = pivot.stack().dropna().rename("price").reset_index()
+    rows.columns = ["style_code", "date", "price"]
+    rows = rows[rng.random(len(rows)) > missing]
+    rows = pd.concat([rows, rows.sample(frac=duplicates, random_state=seed)])
+    titles = dict(zip(pivot.index, product_titles(pivot.index)))
+    rows["product_title"] = rows["style_code"].map(titles)
+    rows["image_url"] = "https://example.com/" + rows["style_code"] + ".png"
+    return rows
+
+
+def sole_supplier(n_products, n_days=365, seed=0, missing=0.1, duplicates=0.02):
+    "`date, style_code, product_title, price, image_url` rows, prices in GBP"
+    rows = _rows(price_pivot(n_products, n_days, seed), seed, missing, duplicates)
+    return rows[["date", "style_code", "product_title", "price", "image_url"]]
+
+
+def goat(n_products, n_days=365, seed=0, missing=0.1, duplicates=0.02):
+    """`date, sku, product_title, retail_price_cents, image_url` rows.
+
+    Style codes are shared with `sole_supplier` for the same `n_products`
+    but written with a space (`"DD1391 100"`), and prices are USD cents.
+    """
+    pivot = price_pivot(n_products, n_days, seed + 1) * 1.25
+    rows = _rows(pivot, seed + 1, missing, duplicates)
+    rows["sku"] = rows["style_code"].str.replace("-", " ", regex=False)
+    rows["retail_price_cents"] = (rows["price"] * 100).round().astype(np.int64)
+    return rows[["date", "sku", "product_title", "retail_price_cents",
+                 "image_url"]]
+
+
+def database(tables, path=":memory:"):
+    """SQLite stand-in for the Postgres database holding `tables`.
+
+    `tables` maps table names to frames; dates are stored as ISO strings,
+    which compare and sort like Postgres dates.
+    """
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA temp_store=MEMORY")
+    connection.execute("PRAGMA cache_size=-200000")
+    if sqlite3.sqlite_version_info < (3, 35):
+        connection.create_function("SQRT", 1, lambda x: None if x is None else x ** 0.5)
+    for name, frame in tables.items():
+        frame = frame.assign(date=frame["date"].astype(str))
+        frame.to_sql(name, connection, index=False)
+    return connection
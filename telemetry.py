@@ -0,0 +1,207 @@
+"""Stage timings, frame sizes and cache counters of the running app.
+
+`span("home.page")` times a block, `frame("home.leaderboard", df)` records
+the rows and memory of a frame and `count("cache", cache="data",
+result="hit")` bumps a counter. Timings and sizes keep a rolling window of
+recent samples for percentiles; counters only go up. Everything can be read
+back with `summary()`, rendered in the Prometheus text format with
+`prometheus()` and, with `TELEMETRY_LOG=1`, logged as one JSON line per
+sample.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# samples kept per series for the rolling percentiles
+window = int(os.environ.get("TELEMETRY_WINDOW", 1000))
+log_samples = os.environ.get("TELEMETRY_LOG", "0") == "1"
+quantiles = (0.5, 0.9, 0.99)
+prefix = "dashboard"
+
+logger = logging.getLogger("telemetry")
+if log_samples:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+class Histogram:
+    "Rolling window of recent samples plus the lifetime count and sum"
+
+    def __init__(self, size=window):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def percentiles(self):
+        "`{quantile: value}` over the window, nan while it is empty"
+        if not self.samples:
+            return {q: float("nan") for q in quantiles}
+        values = np.percentile(
+            np.fromiter(self.samples, float), [q * 100 for q in quantiles])
+        return dict(zip(quantiles, values.tolist()))
+
+
+class Recorder:
+    "Thread-safe store of histograms and counters keyed by name and labels"
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        "Add a sample to the `name` histogram"
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+        if log_samples:
+            logger.info(json.dumps(
+                {"ts": time.time(), "metric": name, "value": value, **labels}))
+
+    def count(self, name, n=1, **labels):
+        "Increase the `name` counter by `n`"
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+        if log_samples:
+            logger.info(json.dumps(
+                {"ts": time.time(), "metric": name, "inc": n, **labels}))
+
+    @contextmanager
+    def span(self, stage):
+        "Record the seconds spent in the `with` block under `stage`"
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage)
+
+    def frame(self, stage, frame):
+        """Record the rows and shallow memory size of `frame`; returns it.
+
+        Shallow sizes leave out the characters of string columns, which
+        would take a pass over every value to add up.
+        """
+        self.observe("frame_rows", len(frame), stage=stage)
+        self.observe("frame_bytes", int(frame.memory_usage(index=True).sum()),
+                     stage=stage)
+        return frame
+
+    def summary(self):
+        "Histogram percentiles and counter values as two lists of dicts"
+        with self._lock:
+            histograms = [
+                {"metric": name, **dict(labels), "count": h.count,
+                 "sum": h.sum, **{f"p{int(q * 100)}": v
+                                  for q, v in h.percentiles().items()}}
+                for (name, labels), h in sorted(self.histograms.items())
+            ]
+            counters = [
+                {"metric": name, **dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+        return histograms, counters
+
+    def prometheus(self, gauges=None):
+        """Everything in the Prometheus text exposition format.
+
+        Histograms are exported as summaries over the rolling window;
+        `gauges` adds `{name: value}` point-in-time values.
+        """
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for name in sorted({name for (name, _), _ in histograms}):
+            lines.append(f"# TYPE {prefix}_{name} summary")
+            for (other, labels), histogram in histograms:
+                if other != name:
+                    continue
+                for q, value in histogram.percentiles().items():
+                    lines.append(_sample(name, labels + (("quantile", q),), value))
+                lines.append(_sample(f"{name}_sum", labels, histogram.sum))
+                lines.append(_sample(f"{name}_count", labels, histogram.count))
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (other, labels), value in counters:
+                if other == name:
+                    lines.append(_sample(f"{name}_total", labels, value))
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(_sample(name, (), value))
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        "Forget every sample and counter"
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    value = float(value)
+    if np.isnan(value):
+        return "NaN"
+    if np.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _sample(name, labels, value):
+    labels = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    if labels:
+        return f"{prefix}_{name}{{{labels}}} {_number(value)}"
+    return f"{prefix}_{name} {_number(value)}"
+
+
+recorder = Recorder()
+
+
+def span(stage):
+    "Time a `with` block: `with telemetry.span(\"home.page\"): ...`"
+    return recorder.span(stage)
+
+
+def frame(stage, data):
+    "Record the rows and memory size of the `data` frame and return it"
+    return recorder.frame(stage, data)
+
+
+def count(name, n=1, **labels):
+    "Increase a counter, e.g. `count(\"cache\", cache=\"data\", result=\"hit\")`"
+    recorder.count(name, n, **labels)
+
+
+def observe(name, value, **labels):
+    "Add a sample to a rolling histogram"
+    recorder.observe(name, value, **labels)
+
+
+def summary():
+    "Percentiles and counters of the shared recorder"
+    return recorder.summary()
+
+
+def prometheus(gauges=None):
+    "Prometheus text of the shared recorder"
+    return recorder.prometheus(gauges)
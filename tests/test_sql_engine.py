@@ -0,0 +1,9 @@
+from benchmark import check_repeated_rows, check_sql_engine
+
+
+def test_matches_pandas():
+    check_sql_engine()
+
+
+def test_repeated_rows():
+    check_repeated_rows()
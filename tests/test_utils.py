@@ -0,0 +1,5 @@
+from benchmark import check_fillna_mode
+
+
+def test_fillna_mode():
+    check_fillna_mode()
@@ -1,16 +1,41 @@
-from math import isnan
+import numpy as np
+import pandas as pd
+
+
+def row_mode(values):
+    """Most common non-nan value of each row of a 2-D float array.
+
+    Ties resolve to the smallest value, like the first column of
+    `DataFrame.mode(axis=1)`; rows without any value get nan.
+    """
+    ordered = np.sort(values, axis=1)  # nan sorts last
+    positions = np.arange(ordered.shape[1])
+    run_start = np.ones(ordered.shape, dtype=bool)
+    run_start[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    start = np.maximum.accumulate(np.where(run_start, positions, 0), axis=1)
+    counts = positions - start + 1
+    counts[np.isnan(ordered)] = 0
+    best = counts.argmax(axis=1)
+    rows = np.arange(len(ordered))
+    return np.where(counts[rows, best] > 0, ordered[rows, best], np.nan)
 
 
 def fillna_mode(dataframe):
-    """Replace nan values in a row with the most common value (mode)"""
-    opts = list(dataframe.columns)
-    df = dataframe[opts].mode(axis=1).reset_index()
-    mode_lst = list(zip(df.iloc[:, 0], df.iloc[:, 1]))
-    for idx in dataframe.index:
-        for index, value in enumerate(dataframe.loc[idx].values):
-            if isnan(value):
-                value = dict(mode_lst)[idx]
-                dataframe.loc[idx].values[index] = value
+    """Replace nan values in a row with the most common value (mode)
+
+    Only the rows holding a nan are touched and the frame is updated in place.
+    """
+    numeric = dataframe.select_dtypes("number").columns
+    values = dataframe[numeric].to_numpy(dtype=float)
+    missing = np.isnan(values)
+    rows = np.flatnonzero(missing.any(axis=1))
+    if len(rows) == 0:
+        return dataframe
+    columns = np.flatnonzero(missing.any(axis=0))
+    modes = row_mode(values[rows])
+    filled = np.where(
+        missing[np.ix_(rows, columns)], modes[:, None], values[np.ix_(rows, columns)])
+    dataframe.iloc[rows, dataframe.columns.get_indexer(numeric[columns])] = filled
     return dataframe
 
 
@@ -28,3 +53,18 @@ def style_positive(value, props=""):
         return props if value > 0 else None
     except:
         pass
+
+
+def style_signs(dataframe, negative="color:red;", positive="color:green;"):
+    """CSS for every cell at once: `negative` below zero, `positive` above.
+
+    Meant for `Styler.apply(style_signs, axis=None)`; non-numeric columns are
+    left unstyled.
+    """
+    styles = np.full(dataframe.shape, "", dtype=object)
+    for position, (_, column) in enumerate(dataframe.items()):
+        if column.dtype.kind in "fiu":
+            values = column.to_numpy(dtype=float)
+            styles[:, position] = np.select(
+                [values < 0, values > 0], [negative, positive], "")
+    return pd.DataFrame(styles, index=dataframe.index, columns=dataframe.columns)
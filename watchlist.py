@@ -0,0 +1,60 @@
+"""The Alerts page: subscriptions and the alerts raised for them."""
+import streamlit as st
+import alerts
+from stores import display_currency, normalize_style_code, registry
+from utils import style_signs
+
+kinds = {
+    "spike": "unusual move",
+    "above": "rose above",
+    "below": "fell below",
+}
+
+
+def watchlist():
+    st.write(f"Follow a model number to see its alerts here. An alert is raised when a day's price is far outside its usual range ({alerts.z_threshold:g} standard deviations from its running average) or crosses a price you set, in {display_currency}. New prices are scanned after every scraper run.")
+    store = alerts.shared_store
+
+    with st.form("subscribe_form", clear_on_submit=True):
+        style_code = st.text_input(
+            "Model Number", max_chars=30,
+            placeholder="Enter your model number here ...")
+        above, below = st.columns(2)
+        above = above.number_input(
+            "Alert above", min_value=0.0, value=0.0, step=10.0,
+            help="0 for no upper threshold")
+        below = below.number_input(
+            "Alert below", min_value=0.0, value=0.0, step=10.0,
+            help="0 for no lower threshold")
+        if st.form_submit_button("Follow") and style_code.strip():
+            store.subscribe(style_code, above or None, below or None)
+            st.success(f"Following {normalize_style_code(style_code)}")
+
+    subscriptions = store.subscriptions()
+    st.subheader("Following")
+    if subscriptions.empty:
+        st.markdown("Not following any model numbers yet")
+        return
+    st.dataframe(subscriptions)
+    remove = st.selectbox("Stop following", [""] + list(subscriptions.index))
+    if remove and st.button(f"Unfollow {remove}"):
+        store.unsubscribe(remove)
+        st.experimental_rerun()
+
+    st.subheader("Alerts")
+    everything = st.checkbox("Show alerts for every model number")
+    feed = store.alerts(None if everything else list(subscriptions.index))
+    if feed.empty:
+        st.markdown("No alerts yet")
+        return
+    labels = {key: entry.label for key, entry in registry.items()}
+    feed = feed.assign(
+        store=feed["store"].map(labels),
+        kind=feed["kind"].map(kinds),
+    ).drop(columns=["id"]).rename(
+        columns={"style_code": "model number", "kind": "alert",
+                 "reference": "average / threshold"})
+    st.dataframe(
+        feed.style.hide()
+        .apply(style_signs, axis=None, subset=["z"])
+    )